@@ -0,0 +1,7 @@
+import pandas as pd
+
+# Run the pipeline under Copy-on-Write, so that transforms never modify the
+# frames they are given and copies are only made when data is actually changed.
+# NOTE: this is a process-wide pandas option. It also applies to any code that
+# imports `scripts` (see "Development" in the README).
+pd.set_option("mode.copy_on_write", True)
@@ -0,0 +1,139 @@
+import re
+import tempfile
+from pathlib import Path
+from typing import Iterable, Optional
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from scripts.engine import query_groupby_sum
+from scripts.logger import logger
+
+UNITS: dict = {"B": 1, "KB": 1e3, "MB": 1e6, "GB": 1e9, "TB": 1e12}
+
+# Number of spill files each level of partitioning fans out to
+FAN_OUT: int = 16
+
+# Partitions still over budget after this many re-partitioning rounds are
+# aggregated anyway (e.g. a single very large group)
+MAX_DEPTH: int = 3
+
+
+def parse_memory(size: str | int) -> int:
+    """Convert a memory size like "4GB" or "512 MB" to a number of bytes."""
+    if isinstance(size, int):
+        return size
+
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?B)\s*", size.upper())
+    if not match:
+        raise ValueError(f"Could not parse memory size '{size}'")
+
+    return int(float(match.group(1)) * UNITS[match.group(2)])
+
+
+def _sum(df: pd.DataFrame, by: list[str]) -> pd.DataFrame:
+    return df.groupby(by, dropna=False, observed=True, as_index=False)["value"].sum()
+
+
+def _partition(df: pd.DataFrame, by: list[str], depth: int) -> pd.Series:
+    """Assign each row to a partition based on the hash of its group key."""
+    # A different hash key per level so that re-partitioning actually splits rows
+    hash_key = f"health_oda_{depth:05d}"
+    hashes = pd.util.hash_pandas_object(df[by], index=False, hash_key=hash_key)
+
+    return hashes % FAN_OUT
+
+
+def _spill(df: pd.DataFrame, by: list[str], folder: Path, name: str, depth: int):
+    """Write each hash partition of `df` to its own spill file."""
+    for partition, group in df.groupby(_partition(df, by, depth), sort=False):
+        path = folder / f"p{partition:02d}"
+        path.mkdir(parents=True, exist_ok=True)
+        group.to_parquet(path / f"{name}.parquet", index=False)
+
+
+def _in_memory_size(files: list[Path]) -> int:
+    """Estimate the in-memory size of a set of spill files from their metadata."""
+    size = 0
+    for file in files:
+        metadata = pq.ParquetFile(file).metadata
+        size += sum(
+            metadata.row_group(i).total_byte_size
+            for i in range(metadata.num_row_groups)
+        )
+
+    return size
+
+
+def _aggregate_partition(
+    folder: Path, by: list[str], budget: int, depth: int
+) -> list[pd.DataFrame]:
+    files = sorted(folder.glob("*.parquet"))
+
+    if _in_memory_size(files) > budget and depth < MAX_DEPTH:
+        logger.debug(f"{folder.name} is over the memory budget. Re-partitioning.")
+        for file in files:
+            _spill(pd.read_parquet(file), by, folder, f"{file.stem}_", depth + 1)
+            file.unlink()
+
+        results = []
+        for sub_folder in sorted(p for p in folder.iterdir() if p.is_dir()):
+            results.extend(_aggregate_partition(sub_folder, by, budget, depth + 1))
+        return results
+
+    return [_sum(pd.concat([pd.read_parquet(f) for f in files]), by)]
+
+
+def spill_groupby_sum(
+    chunks: Iterable[pd.DataFrame],
+    by: list[str],
+    max_memory: str | int,
+    spill_dir: Optional[Path] = None,
+) -> pd.DataFrame:
+    """Sum `value` by `by` without holding the full grouped data in memory.
+
+    Each chunk is pre-aggregated and hash-partitioned by group key into spill
+    files on local disk. Every partition is then aggregated on its own (and split
+    further if it exceeds `max_memory`) and the results are combined. The output
+    matches `df.groupby(by, dropna=False, observed=True)["value"].sum().reset_index()`.
+    """
+    budget = parse_memory(max_memory)
+    dtypes = None
+
+    with tempfile.TemporaryDirectory(dir=spill_dir, prefix="health_oda_") as tmp:
+        folder = Path(tmp)
+
+        for i, chunk in enumerate(chunks):
+            dtypes = dtypes if dtypes is not None else chunk.dtypes[by + ["value"]]
+            _spill(_sum(chunk, by), by, folder, f"chunk{i:05d}", depth=0)
+
+        if dtypes is None:
+            raise ValueError("No data to aggregate")
+
+        results = []
+        for partition in sorted(folder.iterdir()):
+            results.extend(_aggregate_partition(partition, by, budget, depth=1))
+
+    data = pd.concat(results, ignore_index=True).astype(dtypes.to_dict())
+
+    return data.sort_values(by, na_position="last", kind="stable").reset_index(
+        drop=True
+    )
+
+
+def groupby_sum(
+    df: pd.DataFrame,
+    by: list[str],
+    max_memory: Optional[str | int] = None,
+    engine: str = "pandas",
+) -> pd.DataFrame:
+    """Sum `value` by `by`, spilling to disk when a `max_memory` budget is given."""
+    if max_memory is None and engine == "duckdb":
+        return query_groupby_sum(df, by)
+
+    if max_memory is None:
+        return _sum(df, by)
+
+    chunks = [df] if "year" not in df.columns else (g for _, g in df.groupby("year"))
+
+    return spill_groupby_sum(chunks, by, max_memory)
@@ -1,14 +1,18 @@
 import pandas as pd
 
 from scripts import config
+from scripts.aggregate import groupby_sum
 from scripts.bilateral import get_bilateral_health_oda
+from scripts.profiling import parse_profile_flag, profiled
 
 
+@profiled
 def health_with_and_without_covid(
     prices: str = "constant",
     base_year: int = 2024,
     start_year: int = 2015,
     end_year: int = 2023,
+    engine: str = "pandas",
 ) -> pd.DataFrame:
 
     grouper = ["year", "donor_code"]
@@ -21,10 +25,9 @@ def health_with_and_without_covid(
             prices=prices,
             base_year=base_year,
             exclude_covid=False,
+            engine=engine,
         )
-        .groupby(grouper, observed=True, dropna=False)["value"]
-        .sum()
-        .reset_index()
+        .pipe(groupby_sum, grouper, engine=engine)
         .assign(indicator="Health ODA (including COVID-19)")
     )
 
@@ -35,10 +38,9 @@ def health_with_and_without_covid(
             prices=prices,
             base_year=base_year,
             exclude_covid=True,
+            engine=engine,
         )
-        .groupby(grouper, observed=True, dropna=False)["value"]
-        .sum()
-        .reset_index()
+        .pipe(groupby_sum, grouper, engine=engine)
         .assign(indicator="Health ODA")
     )
 
@@ -52,9 +54,10 @@ def health_with_and_without_covid(
 
 
 if __name__ == "__main__":
-    from oda_data import donor_groupings
+    from scripts.session import get_session
 
-    dac = donor_groupings()["dac_countries"]
+    parse_profile_flag()
+    dac = get_session().donor_group("dac_countries")
     df = health_with_and_without_covid(start_year=2019, base_year=2023)
 
     dac_df = df.loc[lambda d: d.donor_code.isin(list(dac))]
@@ -2,24 +2,23 @@ import pandas as pd
 from bblocks import convert_id
 
 from scripts import config
+from scripts.aggregate import groupby_sum
 from scripts.bilateral import get_bilateral_health_oda
 from scripts.common import add_income_grouping
+from scripts.export import write_atomic
+from scripts.profiling import parse_profile_flag, profiled
 
 
-def groupby_excluding(df: pd.DataFrame, exclude: list[str]) -> pd.DataFrame:
-    return (
-        df.groupby(
-            [c for c in df.columns if c not in exclude + ["value"]],
-            dropna=False,
-            observed=True,
-        )["value"]
-        .sum()
-        .reset_index()
+def groupby_excluding(
+    df: pd.DataFrame, exclude: list[str], engine: str = "pandas"
+) -> pd.DataFrame:
+    return groupby_sum(
+        df, [c for c in df.columns if c not in exclude + ["value"]], engine=engine
     )
 
 
-def africa_not_africa(df: pd.DataFrame) -> pd.DataFrame:
-    df["continent"] = convert_id(
+def africa_not_africa(df: pd.DataFrame, engine: str = "pandas") -> pd.DataFrame:
+    continent = convert_id(
         df.recipient_code,
         from_type="DACCode",
         to_type="continent",
@@ -35,22 +34,24 @@ def africa_not_africa(df: pd.DataFrame) -> pd.DataFrame:
             1030: "Africa",
         },
     )
+    df = df.assign(continent=continent)
+
     africa = (
         df.loc[lambda d: d.continent == "Africa"]
-        .pipe(groupby_excluding, exclude=["continent", "recipient_code"])
+        .pipe(groupby_excluding, exclude=["continent", "recipient_code"], engine=engine)
         .assign(recipient="Africa")
     )
     not_africa = (
         df.loc[lambda d: d.continent != "Africa"]
-        .pipe(groupby_excluding, exclude=["continent", "recipient_code"])
+        .pipe(groupby_excluding, exclude=["continent", "recipient_code"], engine=engine)
         .assign(recipient="Other regions")
     )
 
     return pd.concat([africa, not_africa], ignore_index=True)
 
 
-def by_regions(df: pd.DataFrame) -> pd.DataFrame:
-    df["recipient"] = convert_id(
+def by_regions(df: pd.DataFrame, engine: str = "pandas") -> pd.DataFrame:
+    recipient = convert_id(
         df.recipient_code,
         from_type="DACCode",
         to_type="continent",
@@ -82,43 +83,50 @@ def by_regions(df: pd.DataFrame) -> pd.DataFrame:
             1035: "Oceania",
         },
     )
-    data = df.pipe(groupby_excluding, exclude=["recipient_code"])
+    df = df.assign(recipient=recipient)
+
+    data = df.pipe(groupby_excluding, exclude=["recipient_code"], engine=engine)
 
     return data
 
 
-def low_income_other_income(df: pd.DataFrame) -> pd.DataFrame:
+def low_income_other_income(df: pd.DataFrame, engine: str = "pandas") -> pd.DataFrame:
     df = add_income_grouping(df)
 
     low_income = (
         df.loc[lambda d: d.income_level == "Low income"]
-        .pipe(groupby_excluding, exclude=["income_level", "recipient_code"])
+        .pipe(
+            groupby_excluding, exclude=["income_level", "recipient_code"], engine=engine
+        )
         .assign(recipient="Low income")
     )
 
     other_income = (
         df.loc[lambda d: d.income_level != "Low income"]
-        .reset_index(drop=True)
-        .pipe(groupby_excluding, exclude=["income_level", "recipient_code"])
+        .pipe(
+            groupby_excluding, exclude=["income_level", "recipient_code"], engine=engine
+        )
         .assign(recipient="Other income levels")
     )
 
     return pd.concat([low_income, other_income], ignore_index=True)
 
 
-def by_income(df: pd.DataFrame) -> pd.DataFrame:
+def by_income(df: pd.DataFrame, engine: str = "pandas") -> pd.DataFrame:
     df = add_income_grouping(df).rename(columns={"income_level": "recipient"})
-    df.recipient = df.recipient.fillna("Not classified by income level")
-    data = df.pipe(groupby_excluding, exclude=["recipient_code"])
+    df = df.assign(recipient=df.recipient.fillna("Not classified by income level"))
+    data = df.pipe(groupby_excluding, exclude=["recipient_code"], engine=engine)
 
     return data
 
 
+@profiled
 def health_with_and_without_covid(
     prices: str = "constant",
     base_year: int = 2023,
     start_year: int = 2015,
     end_year: int = 2023,
+    engine: str = "pandas",
 ) -> pd.DataFrame:
 
     grouper = ["year", "recipient_code"]
@@ -132,10 +140,9 @@ def health_with_and_without_covid(
             base_year=base_year,
             exclude_covid=False,
             by_recipient=True,
+            engine=engine,
         )
-        .groupby(grouper, observed=True, dropna=False)["value"]
-        .sum()
-        .reset_index()
+        .pipe(groupby_sum, grouper, engine=engine)
         .assign(indicator="Health ODA (including COVID-19)")
     )
 
@@ -147,17 +154,16 @@ def health_with_and_without_covid(
             base_year=base_year,
             exclude_covid=True,
             by_recipient=True,
+            engine=engine,
         )
-        .groupby(grouper, observed=True, dropna=False)["value"]
-        .sum()
-        .reset_index()
+        .pipe(groupby_sum, grouper, engine=engine)
         .assign(indicator="Health ODA")
     )
 
     data = pd.concat([health, health_without_covid], ignore_index=True)
 
-    regions = africa_not_africa(data.copy())
-    income_levels = low_income_other_income(data.copy())
+    regions = africa_not_africa(data, engine=engine)
+    income_levels = low_income_other_income(data, engine=engine)
 
     data = pd.concat([regions, income_levels], ignore_index=True)
 
@@ -169,7 +175,8 @@ def health_with_and_without_covid(
 
 
 if __name__ == "__main__":
+    parse_profile_flag()
     df = health_with_and_without_covid(start_year=2008)
-    df.to_csv(
-        config.Paths.output / "health_by_recipient_income_constant.csv", index=False
+    write_atomic(
+        df, config.Paths.output / "health_by_recipient_income_constant.csv", fmt="csv"
     )
@@ -4,16 +4,15 @@ import pandas as pd
 from oda_data import set_data_path
 
 from scripts import config
-from scripts.common import (
-    get_health_oda_indicator,
-    remove_covid_keyword,
-    remove_covid_purpose,
-    remove_covid_trust_fund,
-)
+from scripts.aggregate import groupby_sum
+from scripts.common import get_health_oda_indicator, remove_covid
+from scripts.engine import query_groupby_sum
+from scripts.profiling import parse_profile_flag, profiled
 
 set_data_path(config.Paths.raw_data)
 
 
+@profiled
 def get_bilateral_health_oda(
     start_year: int = 2000,
     end_year: int = 2023,
@@ -23,25 +22,12 @@ def get_bilateral_health_oda(
     base_year: Optional[int] = None,
     exclude_covid: bool = False,
     additional_groupers: Optional[list[str]] = None,
+    max_memory: Optional[str] = None,
+    engine: str = "pandas",
+    indicator: str | list[str] = "crs_bilateral_flow_disbursement_gross",
+    donors: Optional[list[int]] = None,
 ) -> pd.DataFrame:
-    """"""
-    data = get_health_oda_indicator(
-        indicator="crs_bilateral_flow_disbursement_gross",
-        start_year=start_year,
-        end_year=end_year,
-        prices=prices,
-        currency=currency,
-        base_year=base_year,
-    )
-
-    data["indicator"] = "bilateral_health_oda"
-    data["value"] = data["value"].astype(float)
-
-    if exclude_covid:
-        data = remove_covid_keyword(data)
-        data = remove_covid_purpose(data)
-        data = remove_covid_trust_fund(data)
-
+    """Bilateral health ODA by year, indicator, donor and prices."""
     grouper = ["year", "indicator", "donor_code", "prices"] + (
         additional_groupers or []
     )
@@ -49,15 +35,52 @@ def get_bilateral_health_oda(
     if by_recipient:
         grouper.append("recipient_code")
 
-    data = (
-        data.groupby(grouper, observed=True, dropna=False)["value"].sum().reset_index()
-    )
+    def load(**kwargs) -> pd.DataFrame:
+        return get_health_oda_indicator(
+            indicator=indicator,
+            start_year=start_year,
+            end_year=end_year,
+            prices=prices,
+            currency=currency,
+            base_year=base_year,
+            engine=engine,
+            donors=donors,
+            **kwargs,
+        )
+
+    # Out of core, the data is grouped straight to `grouper` so that only the
+    # final aggregate is held in memory
+    spill = max_memory is not None
+
+    if spill:
+        data = load(max_memory=max_memory, by=grouper, exclude_covid=exclude_covid)
+    else:
+        data = load()
+
+    # With several indicators, keep their names to tell them apart
+    if isinstance(indicator, str):
+        data["indicator"] = "bilateral_health_oda"
+    data["value"] = data["value"].astype(float)
+
+    if spill:
+        return data
+
+    # With DuckDB, the COVID-19 exclusions run in the grouping query
+    fused = engine == "duckdb"
+
+    if exclude_covid and not fused:
+        data = remove_covid(data, engine=engine)
+
+    if fused:
+        return query_groupby_sum(data, grouper, exclude_covid=exclude_covid)
+
+    data = groupby_sum(data, grouper, engine=engine)
 
     return data
 
 
 if __name__ == "__main__":
-
+    parse_profile_flag()
     df = get_bilateral_health_oda(2013, 2023, by_recipient=False)
 
 
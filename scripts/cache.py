@@ -0,0 +1,45 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+
+from scripts import config
+
+# The raw CRS file that cached data is built from
+CRS_SOURCE: str = "fullCRS.parquet"
+
+
+def crs_version() -> Optional[int]:
+    """The modification time of the raw CRS file, or None if it is not downloaded."""
+    path = config.Paths.raw_data / CRS_SOURCE
+    return path.stat().st_mtime_ns if path.exists() else None
+
+
+def cache_key(params: dict) -> str:
+    """Build a stable file key from the parameters of a dataset."""
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def write_shared_table(df: pd.DataFrame | pa.Table, path: Path) -> None:
+    """Write a dataframe as an uncompressed Arrow IPC file, so it can be memory mapped."""
+    table = (
+        df
+        if isinstance(df, pa.Table)
+        else pa.Table.from_pandas(df, preserve_index=False)
+    )
+    tmp = path.with_suffix(".tmp")
+
+    with pa.OSFile(str(tmp), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    os.replace(tmp, path)
+
+
+def open_shared_table(path: Path) -> pa.Table:
+    """Open an Arrow IPC file as a memory-mapped (zero-copy) table."""
+    return pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
@@ -0,0 +1,135 @@
+import hashlib
+import json
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from scripts import config
+from scripts.cache import open_shared_table, write_shared_table
+
+# Bump when the layout of the compiled index changes
+INDEX_VERSION: int = 1
+
+# Column names used in the pipeline, and the code list they map to
+ALIASES: dict = {
+    "aid_type_code": "AidType",
+    "channel_code": "Channelcode",
+    "finance_type_code": "FinanceType",
+    "flow_code": "FlowType",
+    "income_group_code": "Income-group",
+    "purpose_code": "Sector",
+    "sector_code": "SectorCategory",
+}
+
+# The manifest of each index folder, kept in memory while the JSON is unchanged
+_manifests: dict = {}
+
+
+def _source() -> Path:
+    return config.Paths.raw_data / "crs_codes.json"
+
+
+@lru_cache(maxsize=None)
+def _hash(path: Path, mtime: float, size: int) -> str:
+    """The sha256 of a file. Cached until the file changes."""
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _code_table(codes: dict) -> pa.Table:
+    """A (code, name) table sorted by code. Codes are integers when possible."""
+    keys = list(codes)
+    names = [v["name"] for v in codes.values()]
+
+    if all(k.isdigit() for k in keys):
+        keys = [int(k) for k in keys]
+
+    table = pa.table({"code": keys, "name": names})
+
+    return table.sort_by("code")
+
+
+def build_code_index() -> Path:
+    """Compile crs_codes.json into one memory-mappable Arrow file per code list."""
+    source = _source()
+    folder = config.Paths.codes_index
+    folder.mkdir(parents=True, exist_ok=True)
+
+    codes = json.loads(source.read_text())
+
+    for dimension, values in codes.items():
+        write_shared_table(_code_table(values), folder / f"{dimension}.arrow")
+
+    manifest = {
+        "version": INDEX_VERSION,
+        "source_sha256": hashlib.sha256(source.read_bytes()).hexdigest(),
+        "dimensions": list(codes),
+    }
+    (folder / "manifest.json").write_text(json.dumps(manifest, indent=2))
+
+    return folder
+
+
+def _ensure_index() -> dict:
+    """Return the index manifest, rebuilding the index if the JSON has changed."""
+    source = _source()
+    stat = source.stat()
+    current = _hash(source, stat.st_mtime, stat.st_size)
+
+    folder = config.Paths.codes_index
+    manifest = _manifests.get(folder, {})
+    if manifest.get("source_sha256") == current:
+        return manifest
+
+    path = folder / "manifest.json"
+    manifest = json.loads(path.read_text()) if path.exists() else {}
+
+    if (
+        manifest.get("version") != INDEX_VERSION
+        or manifest.get("source_sha256") != current
+    ):
+        build_code_index()
+        manifest = json.loads(path.read_text())
+        _load_dimension.cache_clear()
+
+    _manifests[folder] = manifest
+
+    return manifest
+
+
+@lru_cache(maxsize=None)
+def _load_dimension(dimension: str) -> pa.Table:
+    return open_shared_table(config.Paths.codes_index / f"{dimension}.arrow")
+
+
+def label(
+    codes: pd.Series | np.ndarray | list, dimension: str
+) -> pd.Series | np.ndarray:
+    """Return the names for an array of codes from a CRS code list.
+
+    Args:
+        codes: the codes to label. Codes that are not in the code list get no name.
+        dimension: the code list, e.g. "Sector" or its column name "purpose_code".
+
+    Returns:
+        The names, as a Series aligned with `codes` if a Series was passed.
+    """
+    dimension = ALIASES.get(dimension, dimension)
+
+    if dimension not in _ensure_index()["dimensions"]:
+        raise KeyError(f"Unknown code list '{dimension}'")
+
+    table = _load_dimension(dimension)
+    # Missing codes (None, NaN or NA) become nulls, and get no name
+    values = pa.array(codes, from_pandas=True).cast(table.schema.field("code").type)
+
+    names = table.column("name").take(pc.index_in(values, value_set=table["code"]))
+    names = names.to_numpy(zero_copy_only=False)
+
+    if isinstance(codes, pd.Series):
+        return pd.Series(names, index=codes.index, name=codes.name)
+
+    return names
@@ -1,33 +1,60 @@
+import itertools
 from typing import Optional
 
 import pandas as pd
-from oda_data import recipient_groupings, ODAData, set_data_path, read_crs
+from oda_data import ODAData, set_data_path, read_crs
 
 from oda_data.clean_data.schema import OdaSchema
 
 from scripts import config
+from scripts.aggregate import groupby_sum, spill_groupby_sum
+from scripts.engine import (
+    check_engine,
+    query_filter_sectors,
+    query_groupby_sum,
+    query_remove_covid,
+)
+from scripts.profiling import parse_profile_flag, profiled
+from scripts.session import get_session
 
 set_data_path(config.Paths.raw_data)
 
+# The recipient groups, and the oda_data grouping each one is read from
 RECIPIENT_GROUPS = {
     "Developing Countries, Total": None,
-    "Africa": recipient_groupings()["african_countries_regional"],
-    "Sahel countries": recipient_groupings()["sahel"],
-    "Least Developed Countries": recipient_groupings()["ldc_countries"],
-    "France priority countries": recipient_groupings()["france_priority"],
+    "Africa": "african_countries_regional",
+    "Sahel countries": "sahel",
+    "Least Developed Countries": "ldc_countries",
+    "France priority countries": "france_priority",
 }
 
 CURRENCIES: dict = {"USD": "USA", "EUR": "EUI", "GBP": "GBR", "CAD": "CAN"}
 
 
+def recipient_group(name: str) -> Optional[dict]:
+    """Return the {code: name} members of a recipient group, from the session.
+
+    "Developing Countries, Total" has no member list, so None is returned.
+    """
+    grouping = RECIPIENT_GROUPS[name]
+    return None if grouping is None else get_session().recipient_group(grouping)
+
+
 def add_income_grouping(df: pd.DataFrame) -> pd.DataFrame:
-    """Add the income groupings to the dataframe."""
+    """Add the income groupings to the dataframe, from the session."""
+    return get_session().add_income_level(df)
+
+
+def bblocks_income_grouping(df: pd.DataFrame) -> pd.DataFrame:
+    """Add the income groupings to the dataframe, from bblocks."""
     from bblocks import add_income_level_column, set_bblocks_data_path
 
     set_bblocks_data_path(config.Paths.raw_data)
 
+    # bblocks adds the column in place. Under Copy-on-Write this copy is lazy,
+    # and it stops the caller's frame from being modified
     df = add_income_level_column(
-        df, id_column=OdaSchema.RECIPIENT_CODE, id_type="DACCode"
+        df.copy(), id_column=OdaSchema.RECIPIENT_CODE, id_type="DACCode"
     )
 
     return df
@@ -254,28 +281,33 @@ def covid_sectors():
     ]
 
 
-def filter_covid_sectors(df: pd.DataFrame, health_only: bool = True) -> pd.DataFrame:
+def filter_covid_sectors(
+    df: pd.DataFrame, health_only: bool = True, engine: str = "pandas"
+) -> pd.DataFrame:
     # Load the list of sectors
     health = get_health_purpose_codes()
     covid = covid_sectors() if not health_only else []
     sectors = list(set(health + covid))
 
+    if engine == "duckdb":
+        return query_filter_sectors(df, sectors)
+
     # Filter the dataframe
-    return df[df[OdaSchema.PURPOSE_CODE].isin(sectors)].reset_index(drop=True)
+    return df[df[OdaSchema.PURPOSE_CODE].isin(sectors)]
 
 
 def filter_low_income_countries(df: pd.DataFrame) -> pd.DataFrame:
     """Filter the dataframe to include only low-income countries."""
     df = add_income_grouping(df)
 
-    return df.loc[lambda d: d.income_level == "Low income"].reset_index(drop=True)
+    return df.loc[lambda d: d.income_level == "Low income"]
 
 
 def filter_african_countries(df: pd.DataFrame) -> pd.DataFrame:
     """Filter the dataframe to include only African countries."""
     return df.loc[
-        lambda d: d[OdaSchema.RECIPIENT_CODE].isin(list(RECIPIENT_GROUPS["Africa"]))
-    ].reset_index(drop=True)
+        lambda d: d[OdaSchema.RECIPIENT_CODE].isin(list(recipient_group("Africa")))
+    ]
 
 
 def remove_covid_keyword(df: pd.DataFrame) -> pd.DataFrame:
@@ -302,48 +334,53 @@ def remove_covid_trust_fund(df: pd.DataFrame) -> pd.DataFrame:
     return df.loc[lambda d: d.donor_code != 1047]
 
 
+def remove_covid(df: pd.DataFrame, engine: str = "pandas") -> pd.DataFrame:
+    """Remove COVID-19 keyword, purpose code and trust fund flows."""
+    if engine == "duckdb":
+        return query_remove_covid(df)
+
+    df = remove_covid_keyword(df)
+    df = remove_covid_purpose(df)
+    df = remove_covid_trust_fund(df)
+
+    return df
+
+
 def remap_covid_keyword(df: pd.DataFrame) -> pd.DataFrame:
     # Any rows with 'covid' in the keyword column will have their purpose code remapped to 160
-    df.loc[
-        lambda d: d.keywords.str.contains("covid", case=False, na=False), "purpose_code"
-    ] = 160
+    covid = df.keywords.str.contains("covid", case=False, na=False)
 
-    return df
+    return df.assign(purpose_code=df.purpose_code.mask(covid, 160))
 
 
 def flag_covid_keyword(df: pd.DataFrame) -> pd.DataFrame:
     # Any rows with 'covid' in the keyword column will have their purpose code remapped to 160
-    df["covid_k"] = df.keywords.str.contains("covid", case=False, na=False)
-
-    return df
+    return df.assign(covid_k=df.keywords.str.contains("covid", case=False, na=False))
 
 
 def remap_covid_purpose(df: pd.DataFrame) -> pd.DataFrame:
     # Any rows with purpose code 12264 will have their purpose code remapped to 160
-    df.loc[lambda d: d.purpose_code == 12264, "purpose_code"] = 160
+    # (an NA mask counts as True in `mask`, so missing codes are kept as they are)
+    covid = df.purpose_code.eq(12264).fillna(False)
 
-    return df
+    return df.assign(purpose_code=df.purpose_code.mask(covid, 160))
 
 
 def flag_covid_purpose(df: pd.DataFrame) -> pd.DataFrame:
     # Any rows with purpose code 12264 will have their purpose code remapped to 160
-    df["covid_p"] = df.purpose_code == 12264
-
-    return df
+    return df.assign(covid_p=df.purpose_code == 12264)
 
 
 def remap_covid_trust_fund(df: pd.DataFrame) -> pd.DataFrame:
     # Any rows with donor code 1047 will have their donor code remapped to 160
-    df.loc[lambda d: d.donor_code == 1047, "donor_code"] = 160
+    covid = df.donor_code.eq(1047).fillna(False)
 
-    return df
+    return df.assign(donor_code=df.donor_code.mask(covid, 160))
 
 
 def flag_covid_trust_fund(df: pd.DataFrame) -> pd.DataFrame:
     # Any rows with donor code 1047 will have their donor code remapped to 160
-    df["covid_t"] = df.donor_code == 1047
-
-    return df
+    return df.assign(covid_t=df.donor_code == 1047)
 
 
 GROUPER = [
@@ -358,35 +395,136 @@ GROUPER = [
 ]
 
 
-def get_health_oda_indicator(
-    indicator: str,
-    start_year: int = 2000,
-    end_year: int = 2023,
-    prices: str = "current",
-    currency: str = "USD",
-    base_year: Optional[int] = None,
+def _load_health_indicator(
+    indicator: str | list[str],
+    years: list[int] | range,
+    prices: str,
+    currency: str,
+    base_year: Optional[int],
+    engine: str = "pandas",
+    filter_sectors: bool = True,
+    donors: Optional[list[int]] = None,
 ) -> pd.DataFrame:
-    # Create an ODAData object
+    # Create an ODAData object. Other donors are dropped before any conversion
     oda = ODAData(
-        years=range(start_year, end_year + 1),
+        years=years,
+        donors=donors,
         prices=prices,
         base_year=base_year,
         currency=currency,
     )
 
-    # Load the indicator
+    # Load the indicator(s). Sources shared by several indicators are read once
     oda.load_indicator(indicator)
 
-    # Get the data, filtered by health sectors
-    df = oda.get_data().astype({"value": float}).pipe(filter_covid_sectors)
+    # The same categories for every load, so that chunks can be combined
+    indicators = [indicator] if isinstance(indicator, str) else list(indicator)
+
+    data = oda.get_data().astype(
+        {"value": float, "indicator": pd.CategoricalDtype(indicators)}
+    )
+
+    # Filter by health sectors, unless the caller does it in its own query
+    if filter_sectors:
+        data = filter_covid_sectors(data, engine=engine)
+
+    return data
+
+
+def _health_indicator_chunks(
+    indicator: str | list[str],
+    years: range,
+    prices: str,
+    currency: str,
+    base_year: Optional[int],
+    engine: str = "pandas",
+    donors: Optional[list[int]] = None,
+):
+    """Yield the health data for an indicator one year at a time."""
+    # Imputed multilateral flows need the lookback years in the same load
+    indicators = [indicator] if isinstance(indicator, str) else indicator
+    if any(i.startswith("imputed") for i in indicators):
+        df = _load_health_indicator(
+            indicator, years, prices, currency, base_year, engine=engine, donors=donors
+        )
+        yield from (group for _, group in df.groupby("year"))
+        return
+
+    for year in years:
+        yield _load_health_indicator(
+            indicator, [year], prices, currency, base_year, engine=engine, donors=donors
+        )
+
+
+@profiled
+def get_health_oda_indicator(
+    indicator: str | list[str],
+    start_year: int = 2000,
+    end_year: int = 2023,
+    prices: str = "current",
+    currency: str = "USD",
+    base_year: Optional[int] = None,
+    max_memory: Optional[str] = None,
+    engine: str = "pandas",
+    donors: Optional[list[int]] = None,
+    by: Optional[list[str]] = None,
+    exclude_covid: bool = False,
+) -> pd.DataFrame:
+    """Get the health data for one or more indicators, grouped by `GROUPER`.
+
+    When a list of indicators is passed, the underlying data is read only once
+    and the indicators are told apart by the (categorical) `indicator` column.
+
+    If `max_memory` is given (e.g. "4GB"), the data is loaded year by year and
+    aggregated out of core, spilling partitions to disk. `engine` selects whether
+    the filtering and grouping run in pandas or in DuckDB. If `donors` is given,
+    only their flows are loaded.
+
+    Callers that only need a coarser aggregate can pass it as `by`, dropping the
+    COVID-19 flows first with `exclude_covid`. With `max_memory`, only that
+    aggregate is then held in memory.
+    """
+    check_engine(engine)
+    years = range(start_year, end_year + 1)
+
+    if max_memory is not None:
+        chunks = _health_indicator_chunks(
+            indicator, years, prices, currency, base_year, engine=engine, donors=donors
+        )
+        if exclude_covid:
+            chunks = (remove_covid(chunk, engine=engine) for chunk in chunks)
+        first = next(chunks)
+        grouper = by or [c for c in GROUPER if c in first.columns]
+
+        return spill_groupby_sum(itertools.chain([first], chunks), grouper, max_memory)
+
+    df = _load_health_indicator(
+        indicator,
+        years,
+        prices,
+        currency,
+        base_year,
+        engine=engine,
+        filter_sectors=engine == "pandas",
+        donors=donors,
+    )
 
     # Group the data
-    grouper = [c for c in GROUPER if c in df.columns]
-    df = df.groupby(grouper, dropna=False, observed=True)["value"].sum().reset_index()
+    grouper = by or [c for c in GROUPER if c in df.columns]
 
-    return df
+    if engine == "duckdb":
+        # Filter the health sectors and group in a single query
+        return query_groupby_sum(
+            df, grouper, sectors=get_health_purpose_codes(), exclude_covid=exclude_covid
+        )
 
+    if exclude_covid:
+        df = remove_covid(df)
 
+    return groupby_sum(df, grouper)
+
+
+@profiled
 def get_total_oda_indicator(
     start_year: int = 2000,
     end_year: int = 2023,
@@ -421,8 +559,7 @@ def get_total_oda_indicator(
 
 
 if __name__ == "__main__":
+    parse_profile_flag()
     df = get_total_oda_indicator(start_year=2019, prices="constant", base_year=2023)
-    from oda_data import donor_groupings
-
-    dac = donor_groupings()["dac_countries"]
+    dac = get_session().donor_group("dac_countries")
     dac_df = df.loc[lambda d: d.donor_code.isin(list(dac))]
@@ -8,3 +8,10 @@ class Paths:
     raw_data = project / "raw_data"
     output = project / "output"
     scripts = project / "scripts"
+    shared = raw_data / "shared"
+    session = raw_data / "session"
+    search_index = raw_data / "search_index"
+    codes_index = raw_data / "codes_index"
+    trends = raw_data / "trends"
+    service = raw_data / "service"
+    prefetch = raw_data / "prefetch"
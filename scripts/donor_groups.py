@@ -0,0 +1,131 @@
+from typing import Iterable, Optional
+
+import pandas as pd
+
+from scripts.aggregate import groupby_sum
+
+# DAC code for EU Institutions
+EU_INSTITUTIONS: int = 918
+
+# How EU Institutions (918) are counted in donor group totals:
+# - "include": count 918 in every group that lists it. A group that also lists
+#   EU members counts their imputed flows through the EU Institutions twice
+# - "exclude": never count 918
+# - "standalone": only count 918 on its own. Groups that list it with other
+#   donors are rejected
+# - "net": count 918 in every group that lists it, minus the imputed flows of
+#   the group's other members through the EU Institutions
+EUI_TREATMENTS: tuple = ("include", "exclude", "standalone", "net")
+
+
+def default_donor_groups() -> dict[str, list[int]]:
+    """The donor groups most commonly used in this analysis."""
+    from scripts.session import get_session
+
+    session = get_session()
+
+    return {
+        "DAC countries": list(session.donor_group("dac_countries")),
+        "G7": list(session.donor_group("g7")),
+        "EU27": list(session.donor_group("eu27_countries")),
+        "EU Institutions": [EU_INSTITUTIONS],
+    }
+
+
+def membership_matrix(groups: dict[str, Iterable[int]]) -> pd.DataFrame:
+    """Build a sparse donor x group membership matrix.
+
+    The matrix is stored in long form: one row per (donor_code, donor_group) pair
+    where the donor is a member of the group.
+    """
+    return pd.DataFrame(
+        [(int(donor), group) for group, donors in groups.items() for donor in donors],
+        columns=["donor_code", "donor_group"],
+    ).drop_duplicates(ignore_index=True)
+
+
+def _apply_eui_treatment(membership: pd.DataFrame, treatment: str) -> pd.DataFrame:
+    if treatment not in EUI_TREATMENTS:
+        raise ValueError(
+            f"Unknown EU Institutions treatment '{treatment}'. "
+            f"Choose from {EUI_TREATMENTS}"
+        )
+
+    is_eui = membership.donor_code == EU_INSTITUTIONS
+
+    if treatment == "exclude":
+        return membership.loc[~is_eui]
+
+    if treatment == "standalone":
+        group_size = membership.groupby("donor_group").donor_code.transform("size")
+        shared = membership.loc[is_eui & (group_size > 1), "donor_group"]
+        if len(shared):
+            raise ValueError(
+                f"Groups {sorted(shared)} list EU Institutions ({EU_INSTITUTIONS}) "
+                "with other donors. Pass eu_institutions='net' or 'exclude'."
+            )
+
+    return membership
+
+
+def _rollup(data: pd.DataFrame, membership: pd.DataFrame) -> pd.DataFrame:
+    grouper = [c for c in data.columns if c not in ["donor_code", "value"]]
+
+    return data.merge(membership, on="donor_code", how="inner").pipe(
+        groupby_sum, grouper + ["donor_group"]
+    )
+
+
+def rollup_donor_groups(
+    data: pd.DataFrame,
+    groups: dict[str, Iterable[int]] | pd.DataFrame,
+    eu_institutions: str = "standalone",
+    via_eu_institutions: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """Sum donor-level data into donor group totals in a single pass.
+
+    Args:
+        data: donor-level data with a `donor_code` and a `value` column, such as the
+            output of `get_bilateral_health_oda` or `get_imputed_multilateral_health_oda`.
+        groups: a {group name: donor codes} dictionary, or a membership matrix
+            from `membership_matrix`.
+        eu_institutions: how EU Institutions (918) are counted. One of
+            "include", "exclude", "standalone" or "net" (see `EUI_TREATMENTS`).
+            For a group such as Team Europe (EU27 plus 918), "include" counts
+            the members' imputed flows through 918 twice. Only "net" gives a
+            total without double counting.
+        via_eu_institutions: the members' imputed multilateral flows through
+            918, by `donor_code` and the same other columns as `data`. Required
+            for "net", which subtracts them from each group that lists 918.
+
+    Returns:
+        The data summed by `donor_group` and all the other columns except `donor_code`.
+    """
+    if not isinstance(groups, pd.DataFrame):
+        groups = membership_matrix(groups)
+
+    if eu_institutions == "net" and via_eu_institutions is None:
+        raise ValueError(
+            "eu_institutions='net' needs the members' imputed flows through "
+            f"EU Institutions ({EU_INSTITUTIONS}) as `via_eu_institutions`."
+        )
+
+    membership = _apply_eui_treatment(groups, eu_institutions)
+    totals = _rollup(data, membership)
+
+    if eu_institutions != "net":
+        return totals
+
+    # The other members of the groups that list 918
+    with_eui = membership.loc[lambda d: d.donor_code == EU_INSTITUTIONS, "donor_group"]
+    members = membership.loc[
+        lambda d: d.donor_group.isin(with_eui) & (d.donor_code != EU_INSTITUTIONS)
+    ]
+    routed = _rollup(via_eu_institutions, members)
+
+    keys = [c for c in totals.columns if c != "value"]
+    totals = totals.merge(routed, on=keys, how="left", suffixes=("", "_routed"))
+
+    return totals.assign(value=totals.value - totals.value_routed.fillna(0)).drop(
+        columns="value_routed"
+    )
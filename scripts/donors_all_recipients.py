@@ -1,31 +1,39 @@
 import pandas as pd
-from oda_data import donor_groupings
 
 from scripts import config
+from scripts.aggregate import groupby_sum
 from scripts.bilateral import get_bilateral_health_oda
+from scripts.export import FORMATS, export_partitioned, write_atomic
 from scripts.imputed_multilateral import get_imputed_multilateral_health_oda
+from scripts.profiling import parse_profile_flag, profiled
+from scripts.session import get_session
 
 DONORS = [
     ([4, 5, 6, 7, 918], "EUR"),
     ([302], "USD"),
     ([301], "CAD"),
     ([12], "GBP"),
-    (918),
+    ([918], "EUR"),
 ]
 
 
-def export_total_bi_plus_multi_health_spending(
+@profiled
+def total_bi_plus_multi_health_spending(
     donors: list[int] = None,
     start_year: int = 2012,
     end_year: int = 2022,
     currency: str = "USD",
     prices: str = "constant",
     base_year: int | None = 2022,
-    export_by_donor: bool = False,
     by_recipient: bool = True,
-) -> None:
+    max_memory: str | None = None,
+    engine: str = "pandas",
+) -> pd.DataFrame:
+    """Bilateral plus imputed multilateral health ODA, with and without COVID-19,
+    by year, donor, prices and indicator."""
 
-    donors = donors or [d for d, c in DONORS]
+    # The donors are filtered as the data is loaded, so smaller sets load less
+    donors = donors or sorted({donor for codes, _ in DONORS for donor in codes})
 
     bi_covid = get_bilateral_health_oda(
         start_year=start_year,
@@ -36,6 +44,9 @@ def export_total_bi_plus_multi_health_spending(
         exclude_covid=False,
         by_recipient=by_recipient,
         additional_groupers=["project_title", "purpose_code"],
+        max_memory=max_memory,
+        engine=engine,
+        donors=donors,
     )
     bi = get_bilateral_health_oda(
         start_year=start_year,
@@ -46,6 +57,9 @@ def export_total_bi_plus_multi_health_spending(
         exclude_covid=True,
         by_recipient=by_recipient,
         additional_groupers=["project_title", "purpose_code"],
+        max_memory=max_memory,
+        engine=engine,
+        donors=donors,
     )
     multi_covid = get_imputed_multilateral_health_oda(
         start_year=start_year,
@@ -55,6 +69,8 @@ def export_total_bi_plus_multi_health_spending(
         base_year=base_year,
         by_recipient=by_recipient,
         exclude_covid=False,
+        engine=engine,
+        donors=donors,
     )
     multi = get_imputed_multilateral_health_oda(
         start_year=start_year,
@@ -64,6 +80,8 @@ def export_total_bi_plus_multi_health_spending(
         base_year=base_year,
         by_recipient=by_recipient,
         exclude_covid=True,
+        engine=engine,
+        donors=donors,
     )
 
     bilateral = pd.concat(
@@ -72,7 +90,7 @@ def export_total_bi_plus_multi_health_spending(
             bi_covid.assign(indicator="Health ODA (including COVID-19)"),
         ],
         ignore_index=True,
-    ).loc[lambda d: d.donor_code.isin(donors)]
+    )
 
     multilateral = pd.concat(
         [
@@ -80,7 +98,7 @@ def export_total_bi_plus_multi_health_spending(
             multi_covid.assign(indicator="Health ODA (including COVID-19)"),
         ],
         ignore_index=True,
-    ).loc[lambda d: d.donor_code.isin(donors)]
+    )
 
     # Combine the data
     data = pd.concat(
@@ -92,25 +110,23 @@ def export_total_bi_plus_multi_health_spending(
     )
 
     # Summarize the data
-    data = (
-        data.groupby(
-            ["year", "donor_code", "prices", "indicator"],
-            observed=True,
-            dropna=False,
-        )["value"]
-        .sum()
-        .reset_index()
+    data = groupby_sum(
+        data, ["year", "donor_code", "prices", "indicator"], engine=engine
     )
 
-    # Reshape for export
+    return data
+
+
+def reshape_for_export(data: pd.DataFrame) -> pd.DataFrame:
+    """Pivot the indicators into columns and add donor names."""
     data = data.pivot(
-        index=["year", "donor_code",  "prices"],
+        index=["year", "donor_code", "prices"],
         columns="indicator",
         values="value",
     ).reset_index()
 
     # Add donor names
-    data["donor_name"] = data.donor_code.map(donor_groupings()["dac_members"])
+    data["donor_name"] = data.donor_code.map(get_session().donor_group("dac_members"))
 
     # Clean the dataframe
     data = data.filter(
@@ -122,26 +138,77 @@ def export_total_bi_plus_multi_health_spending(
         ]
     )
 
-    # Export the data
+    return data
+
+
+def write_export(
+    data: pd.DataFrame,
+    prices: str,
+    currency: str,
+    export_by_donor: bool = False,
+    fmt: str = "csv",
+    filename: str = "bi_plus_multi_health_spending_covid_non_covid",
+) -> None:
+    """Write the reshaped data to the output folder."""
     if export_by_donor:
-        for donor in data.donor_name.unique():
-            donor_data = data.loc[lambda d: d.donor_name == donor]
-            donor_data.to_csv(
-                config.Paths.output / f"{donor}_total_health_{prices}_{currency}.csv",
-                index=False,
-            )
+        export_partitioned(
+            data,
+            by="donor_name",
+            filename="{donor_name}_total_health_{prices}_{currency}",
+            fmt=fmt,
+            prices=prices,
+            currency=currency,
+        )
 
     else:
-        data.to_csv(
-            config.Paths.output / "bi_plus_multi_health_spending_covid_non_covid.csv",
-            index=False,
+        write_atomic(
+            data,
+            config.Paths.output / f"{filename}{FORMATS[fmt]}",
+            fmt=fmt,
         )
 
 
-if __name__ == "__main__":
+@profiled
+def export_total_bi_plus_multi_health_spending(
+    donors: list[int] = None,
+    start_year: int = 2012,
+    end_year: int = 2022,
+    currency: str = "USD",
+    prices: str = "constant",
+    base_year: int | None = 2022,
+    export_by_donor: bool = False,
+    by_recipient: bool = True,
+    fmt: str = "csv",
+    max_memory: str | None = None,
+    engine: str = "pandas",
+) -> None:
+
+    data = total_bi_plus_multi_health_spending(
+        donors=donors,
+        start_year=start_year,
+        end_year=end_year,
+        currency=currency,
+        prices=prices,
+        base_year=base_year,
+        by_recipient=by_recipient,
+        max_memory=max_memory,
+        engine=engine,
+    )
 
+    # Reshape and export the data
+    write_export(
+        reshape_for_export(data),
+        prices=prices,
+        currency=currency,
+        export_by_donor=export_by_donor,
+        fmt=fmt,
+    )
+
+
+if __name__ == "__main__":
+    parse_profile_flag()
     export_total_bi_plus_multi_health_spending(
-        donors=donor_groupings()["dac_countries"],
+        donors=list(get_session().donor_group("dac_countries")),
         start_year=2018,
         end_year=2024,
         currency="USD",
@@ -0,0 +1,106 @@
+from typing import Optional
+
+import pandas as pd
+
+ENGINES: tuple = ("pandas", "duckdb")
+
+
+def check_engine(engine: str) -> None:
+    """Raise an error if the engine is not supported."""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}'. Choose from {ENGINES}")
+
+
+def _connect():
+    """Create an in-process DuckDB connection."""
+    try:
+        import duckdb
+    except ImportError as e:
+        raise ImportError(
+            "The duckdb engine requires the duckdb package. "
+            "Install it with `pip install 'health-oda[duckdb]'`."
+        ) from e
+
+    return duckdb.connect()
+
+
+def _quote(column: str) -> str:
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _query(df: pd.DataFrame, sql: str) -> pd.DataFrame:
+    """Run a query against `df`, which is available as the `data` table."""
+    with _connect() as con:
+        con.register("data", df)
+        return con.execute(sql).df()
+
+
+def _restore(result: pd.DataFrame, df: pd.DataFrame) -> pd.DataFrame:
+    """Cast the columns of a query result back to the dtypes of the source frame."""
+    return result.astype(df.dtypes[result.columns].to_dict())
+
+
+def _where(sectors: Optional[list[int]] = None, exclude_covid: bool = False) -> str:
+    """The WHERE clause for the sector filter and the COVID-19 exclusions.
+
+    Comparisons with a missing code are NULL, so those rows are dropped, like
+    the NA-as-False masks in pandas. Missing keywords are not COVID-19 flows.
+    """
+    clauses = ["true"]
+
+    if sectors is not None:
+        codes = ", ".join(str(int(s)) for s in sectors)
+        clauses.append(f"purpose_code IN ({codes})")
+
+    if exclude_covid:
+        clauses += [
+            "NOT coalesce(regexp_matches(keywords, 'covid|c19', 'i'), false)",
+            "purpose_code <> 12264",
+            "donor_code <> 1047",
+        ]
+
+    return " AND ".join(clauses)
+
+
+def query_filter_sectors(df: pd.DataFrame, sectors: list[int]) -> pd.DataFrame:
+    """Keep the rows whose purpose code is in `sectors`."""
+    result = _query(df, f"SELECT * FROM data WHERE {_where(sectors=sectors)}")
+
+    return _restore(result, df)
+
+
+def query_remove_covid(df: pd.DataFrame) -> pd.DataFrame:
+    """Drop COVID-19 keyword, purpose code and trust fund rows in one scan.
+
+    Equivalent to `remove_covid_keyword`, `remove_covid_purpose` and
+    `remove_covid_trust_fund` applied in sequence.
+    """
+    result = _query(df, f"SELECT * FROM data WHERE {_where(exclude_covid=True)}")
+
+    return _restore(result, df)
+
+
+def query_groupby_sum(
+    df: pd.DataFrame,
+    by: list[str],
+    sectors: Optional[list[int]] = None,
+    exclude_covid: bool = False,
+) -> pd.DataFrame:
+    """Sum `value` by `by`. Matches a pandas groupby with dropna=False.
+
+    The sector filter and COVID-19 exclusions can be applied in the same query,
+    so that the filtered rows are never materialised as a frame.
+    """
+    columns = ", ".join(_quote(c) for c in by)
+    result = _query(
+        df,
+        f"SELECT {columns}, coalesce(sum(value), 0) AS value FROM data "
+        f"WHERE {_where(sectors, exclude_covid)} GROUP BY {columns}",
+    )
+
+    # Sort in pandas so that categoricals follow their category order
+    return (
+        _restore(result, df)
+        .sort_values(by, na_position="last", kind="stable")
+        .reset_index(drop=True)
+    )
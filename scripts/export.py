@@ -0,0 +1,105 @@
+import gzip
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+from scripts import config
+from scripts.logger import logger
+
+FORMATS: dict = {"csv": ".csv", "csv.gz": ".csv.gz", "parquet": ".parquet"}
+
+
+def _to_bytes(df: pd.DataFrame, fmt: str) -> bytes:
+    """Serialise a dataframe to bytes in the requested format."""
+    if fmt == "csv":
+        return df.to_csv(index=False).encode("utf-8")
+
+    if fmt == "csv.gz":
+        # mtime is fixed so that identical data always produces identical bytes
+        return gzip.compress(df.to_csv(index=False).encode("utf-8"), mtime=0)
+
+    if fmt == "parquet":
+        return df.to_parquet(index=False, engine="pyarrow")
+
+    raise ValueError(f"Unknown format '{fmt}'. Choose from {list(FORMATS)}")
+
+
+def _file_hash(path: Path) -> str | None:
+    """Return the sha256 of a file, or None if it does not exist."""
+    if not path.exists():
+        return None
+
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def write_atomic(df: pd.DataFrame, path: Path, fmt: str = "csv") -> bool:
+    """Write a dataframe to `path` via a temporary file and an atomic rename.
+
+    The file is left untouched if its content would not change.
+
+    Returns:
+        True if the file was written, False if it was already up to date.
+    """
+    path = Path(path)
+    content = _to_bytes(df, fmt)
+
+    if hashlib.sha256(content).hexdigest() == _file_hash(path):
+        logger.info(f"{path.name} is unchanged. Skipping.")
+        return False
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+    return True
+
+
+def export_partitioned(
+    data: pd.DataFrame,
+    by: str | list[str],
+    filename: str,
+    folder: Optional[Path] = None,
+    fmt: str = "csv",
+    max_workers: Optional[int] = None,
+    **kwargs,
+) -> list[Path]:
+    """Split `data` into one file per group of `by` and write them concurrently.
+
+    Args:
+        data: the dataframe to export.
+        by: the column(s) used to partition the data.
+        filename: a format string for the file name (without extension). It can
+            reference the partition columns and any extra keyword arguments,
+            e.g. "{donor_name}_total_health_{prices}_{currency}".
+        folder: the folder where the files are written. Defaults to the output folder.
+        fmt: one of "csv", "csv.gz" or "parquet".
+        max_workers: the maximum number of files written at the same time.
+
+    Returns:
+        The paths of the files that were (re)written.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'. Choose from {list(FORMATS)}")
+
+    folder = Path(folder or config.Paths.output)
+    by = [by] if isinstance(by, str) else list(by)
+
+    jobs = []
+    for keys, group in data.groupby(by, observed=True, sort=False):
+        name = filename.format(**dict(zip(by, keys)), **kwargs)
+        jobs.append((group, folder / f"{name}{FORMATS[fmt]}"))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        written = pool.map(lambda job: write_atomic(job[0], job[1], fmt=fmt), jobs)
+        return [path for (_, path), was_written in zip(jobs, written) if was_written]
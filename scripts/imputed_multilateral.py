@@ -1,10 +1,13 @@
-from typing import Optional
+from contextlib import contextmanager
+from typing import Callable, Optional
 
 import pandas as pd
 from oda_data import read_crs, set_data_path
 from oda_data.classes.oda_data import READERS
 
 from scripts import config
+from scripts.aggregate import groupby_sum
+from scripts.cache import crs_version
 from scripts.common import (
     remap_covid_keyword,
     remap_covid_purpose,
@@ -15,12 +18,35 @@ from scripts.common import (
     flag_covid_trust_fund,
     filter_covid_sectors,
 )
+from scripts.profiling import parse_profile_flag, profiled
+from scripts.session import get_session
 
 set_data_path(config.Paths.raw_data)
 
+# Imputations for a year also need the data for the years before it
+IMPUTATION_LOOKBACK: int = 2
 
+
+def read_crs_cached(years):
+    """Read the CRS for `years` from hot intermediates of the session.
+
+    Each year is kept once in the session snapshot, whatever years it is read
+    with, and read again once fullCRS.parquet changes.
+    """
+    session, version = get_session(), crs_version()
+
+    return pd.concat(
+        [
+            session.intermediate(f"crs_{year}", read_crs, version=version, years=[year])
+            for year in sorted(int(y) for y in years)
+        ],
+        ignore_index=True,
+    )
+
+
+@profiled
 def read_crs_remap_covid(years):
-    data = read_crs(years)
+    data = read_crs_cached(years)
 
     data = (
         data.pipe(remap_covid_keyword)
@@ -32,7 +58,7 @@ def read_crs_remap_covid(years):
 
 
 def read_crs_eui(years):
-    data = read_crs(years)
+    data = read_crs_cached(years)
 
     data = (
         data.pipe(flag_covid_keyword)
@@ -43,10 +69,22 @@ def read_crs_eui(years):
     return data
 
 
-def monkey_patch_read_crs():
-    READERS["crs"] = read_crs_remap_covid
+@contextmanager
+def crs_reader(reader: Callable):
+    """Make oda_data read the CRS with `reader`, restoring its reader afterwards.
 
+    Other indicators (e.g. bilateral flows) also read the CRS through oda_data,
+    so the reader must not stay patched after the imputed flows are loaded.
+    """
+    previous = READERS["crs"]
+    READERS["crs"] = reader
+    try:
+        yield
+    finally:
+        READERS["crs"] = previous
 
+
+@profiled
 def get_imputed_multilateral_health_oda(
     start_year: int = 2000,
     end_year: int = 2024,
@@ -55,41 +93,48 @@ def get_imputed_multilateral_health_oda(
     currency: str = "USD",
     base_year: Optional[int] = None,
     exclude_covid: bool = False,
+    engine: str = "pandas",
+    indicator: str | list[str] = "imputed_multi_flow_disbursement_gross",
+    donors: Optional[list[int]] = None,
 ) -> pd.DataFrame:
+    """Imputed multilateral health ODA by year, indicator, donor and prices."""
+    reader = read_crs_remap_covid if exclude_covid else read_crs_cached
+
+    with crs_reader(reader):
+        data = get_health_oda_indicator(
+            indicator=indicator,
+            start_year=start_year - IMPUTATION_LOOKBACK,
+            end_year=end_year,
+            prices=prices,
+            currency=currency,
+            base_year=base_year,
+            engine=engine,
+            donors=donors,
+        )
 
-    if exclude_covid:
-        monkey_patch_read_crs()
-    else:
-        READERS["crs"] = read_crs
-
-    data = get_health_oda_indicator(
-        indicator="imputed_multi_flow_disbursement_gross",
-        start_year=start_year - 2,
-        end_year=end_year,
-        prices=prices,
-        currency=currency,
-        base_year=base_year,
-    ).loc[lambda d: d.year >= start_year]
-
-    data["indicator"] = "imputed_multilateral_health_oda"
+    data = data.loc[lambda d: d.year >= start_year]
+
+    # With several indicators, keep their names to tell them apart
+    if isinstance(indicator, str):
+        data["indicator"] = "imputed_multilateral_health_oda"
     data["value"] = data["value"].astype(float)
 
     grouper = ["year", "indicator", "donor_code", "prices"]
     if by_recipient:
         grouper.append("recipient_code")
 
-    data = (
-        data.groupby(grouper, observed=True, dropna=False)["value"].sum().reset_index()
-    )
+    data = groupby_sum(data, grouper, engine=engine)
 
     return data
 
 
+@profiled
 def imputed_health_with_and_without_covid(
     prices: str = "constant",
     base_year: int = 2024,
     start_year: int = 2015,
     end_year: int = 2024,
+    engine: str = "pandas",
 ) -> pd.DataFrame:
 
     grouper = ["year", "donor_code"]
@@ -102,10 +147,9 @@ def imputed_health_with_and_without_covid(
             prices=prices,
             base_year=base_year,
             exclude_covid=False,
+            engine=engine,
         )
-        .groupby(grouper, observed=True, dropna=False)["value"]
-        .sum()
-        .reset_index()
+        .pipe(groupby_sum, grouper, engine=engine)
         .assign(indicator="Health ODA (including COVID-19)")
     )
 
@@ -116,10 +160,9 @@ def imputed_health_with_and_without_covid(
             prices=prices,
             base_year=base_year,
             exclude_covid=True,
+            engine=engine,
         )
-        .groupby(grouper, observed=True, dropna=False)["value"]
-        .sum()
-        .reset_index()
+        .pipe(groupby_sum, grouper, engine=engine)
         .assign(indicator="Health ODA")
     )
 
@@ -133,9 +176,8 @@ def imputed_health_with_and_without_covid(
 
 
 if __name__ == "__main__":
-    from oda_data import donor_groupings
-
-    dac = donor_groupings()["dac_countries"]
+    parse_profile_flag()
+    dac = get_session().donor_group("dac_countries")
     df = imputed_health_with_and_without_covid(
         start_year=2019, base_year=2024, prices="constant"
     )
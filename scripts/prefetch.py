@@ -0,0 +1,253 @@
+"""Concurrent cold-start prefetch of the pipeline inputs.
+
+The default tasks fetch each dataset through its own package (oda_data, pydeflate
+and bblocks), which download it in one go. Only tasks built with `url_task`
+download through `download`, and can resume a partial file. Failed tasks are
+retried by `prefetch`, so a retried `url_task` continues where it stopped.
+"""
+
+import http.client
+import json
+import os
+import shutil
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Optional
+
+from filelock import FileLock
+
+from scripts import config
+from scripts.logger import logger
+
+# Same format as the entries written by the oda_reader cache
+TIMESTAMP: str = "%Y-%m-%dT%H:%M:%S.%f%z"
+
+# Kept apart from `raw_data/manifest.json`, which belongs to the oda_reader cache
+MANIFEST: str = "manifest.json"
+
+
+@dataclass
+class PrefetchTask:
+    """An input dataset to acquire before the pipeline runs."""
+
+    name: str
+    fetch: Callable[[], None]
+    filename: Optional[str] = None
+    ttl_days: int = 30
+
+
+def download(url: str, path: Path, timeout: int = 60) -> Path:
+    """Download a file, resuming a partial download where possible.
+
+    Data is written to `<path>.part` and renamed once complete. A failed download
+    keeps the partial file, and if the server supports range requests the next
+    call continues from its end. Retrying is left to the caller.
+    """
+    path = Path(path)
+    part = path.with_name(f"{path.name}.part")
+
+    offset = part.stat().st_size if part.exists() else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    try:
+        request = urllib.request.Request(url, headers=headers)
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            # The server ignored the range, so start again
+            mode = "ab" if offset and response.status == 206 else "wb"
+            with open(part, mode) as f:
+                shutil.copyfileobj(response, f, length=1024 * 1024)
+
+            # urllib does not raise if the connection drops before the end
+            if response.length:
+                raise http.client.IncompleteRead(b"", response.length)
+
+    except urllib.error.HTTPError as e:
+        # The partial file already holds the whole resource
+        if e.code != 416 or not offset:
+            raise
+
+    os.replace(part, path)
+    return path
+
+
+def url_task(name: str, url: str, filename: str, ttl_days: int = 30) -> PrefetchTask:
+    """A task that downloads a single file into the raw data folder."""
+    return PrefetchTask(
+        name=name,
+        fetch=lambda: download(url, config.Paths.raw_data / filename),
+        filename=filename,
+        ttl_days=ttl_days,
+    )
+
+
+def default_tasks(base_year: int = 2023) -> list[PrefetchTask]:
+    """The inputs needed by the pipeline, fetched through their own packages."""
+    import pandas as pd
+    from oda_data import download_crs, download_multisystem, set_data_path
+    from oda_data.tools.names import download_crs_codes
+    from pydeflate import (
+        get_oecd_dac_deflators,
+        get_oecd_dac_exchange_rates,
+        set_pydeflate_path,
+    )
+
+    set_data_path(config.Paths.raw_data)
+    set_pydeflate_path(config.Paths.raw_data)
+
+    def income_levels():
+        from bblocks import add_income_level_column, set_bblocks_data_path
+
+        set_bblocks_data_path(config.Paths.raw_data)
+        add_income_level_column(
+            pd.DataFrame({"recipient_code": [228]}),
+            id_column="recipient_code",
+            id_type="DACCode",
+            update_data=True,
+        )
+
+    return [
+        PrefetchTask("crs", download_crs, filename="fullCRS.parquet"),
+        PrefetchTask(
+            "multisystem", download_multisystem, filename="multisystem_raw.parquet"
+        ),
+        PrefetchTask(
+            "dac_deflators", lambda: get_oecd_dac_deflators(base_year=base_year)
+        ),
+        PrefetchTask("dac_exchange_rates", get_oecd_dac_exchange_rates),
+        PrefetchTask("income_levels", income_levels),
+        PrefetchTask("crs_codes", download_crs_codes, filename="crs_codes.json"),
+    ]
+
+
+def _read_manifest() -> dict:
+    path = config.Paths.prefetch / MANIFEST
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def _record(task: PrefetchTask) -> None:
+    """Add a fetched task to the manifest, keeping entries written by others."""
+    path = config.Paths.prefetch / MANIFEST
+
+    with FileLock(str(path.with_suffix(".lock"))):
+        manifest = _read_manifest()
+        manifest[task.name] = {
+            "filename": task.filename,
+            "downloaded_at": datetime.now(timezone.utc).strftime(TIMESTAMP),
+            "ttl_days": task.ttl_days,
+        }
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(manifest, indent=2))
+        os.replace(tmp, path)
+
+
+def _is_fresh(
+    task: PrefetchTask, manifest: dict, since: Optional[datetime] = None
+) -> bool:
+    """Whether a task was already fetched and has not expired.
+
+    If `since` is given, the task must also have been fetched after that time.
+    """
+    record = manifest.get(task.name)
+    if record is None:
+        return False
+
+    if task.filename and not (config.Paths.raw_data / task.filename).exists():
+        return False
+
+    downloaded = datetime.strptime(record["downloaded_at"], TIMESTAMP)
+    if since is not None and downloaded < since:
+        return False
+
+    return datetime.now(timezone.utc) - downloaded < timedelta(days=record["ttl_days"])
+
+
+def _run(task: PrefetchTask, retries: int, since: datetime) -> Optional[float]:
+    """Run a task under its own lock, retrying on failure, and record it.
+
+    Concurrent prefetches wait for each other, and a task fetched by another
+    process while waiting is not fetched again.
+
+    Returns:
+        The time it took, or None if the task was fetched by another process.
+    """
+    with FileLock(str(config.Paths.prefetch / f"{task.name}.lock")):
+        if _is_fresh(task, _read_manifest(), since=since):
+            return None
+
+        start = time.perf_counter()
+
+        for attempt in range(1, retries + 1):
+            try:
+                task.fetch()
+                break
+            except Exception as e:
+                # A client error, such as a missing file, fails again on retry
+                client_error = isinstance(e, urllib.error.HTTPError) and e.code < 500
+                if attempt == retries or client_error:
+                    raise
+                logger.info(f"Retrying {task.name} ({attempt}/{retries})")
+                time.sleep(2 ** (attempt - 1))
+
+        _record(task)
+
+    return time.perf_counter() - start
+
+
+def prefetch(
+    tasks: Optional[list[PrefetchTask]] = None,
+    max_workers: int = 4,
+    retries: int = 3,
+    refresh: bool = False,
+) -> dict[str, float]:
+    """Acquire the pipeline inputs concurrently, recording them in a manifest.
+
+    Tasks already in `raw_data/prefetch/manifest.json` and within their
+    time-to-live are skipped unless `refresh` is True. Each task is recorded as
+    soon as it succeeds, so a failed task does not lose the others.
+
+    Returns:
+        The seconds spent on each task that was run.
+
+    Raises:
+        RuntimeError: If any task failed after all its retries.
+    """
+    tasks = default_tasks() if tasks is None else tasks
+    config.Paths.prefetch.mkdir(parents=True, exist_ok=True)
+    started = datetime.now(timezone.utc)
+
+    manifest = _read_manifest()
+    pending = [t for t in tasks if refresh or not _is_fresh(t, manifest)]
+
+    # A refresh only skips tasks that another process fetched during this call
+    since = started if refresh else None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {t.name: pool.submit(_run, t, retries, since) for t in pending}
+
+    timings, errors = {}, {}
+    for name, future in futures.items():
+        try:
+            duration = future.result()
+        except Exception as e:
+            errors[name] = e
+            continue
+        if duration is not None:
+            timings[name] = duration
+
+    logger.info(f"Prefetched {len(timings)} datasets: {timings}")
+
+    if errors:
+        raise RuntimeError(f"Failed to prefetch {sorted(errors)}: {errors}") from next(
+            iter(errors.values())
+        )
+
+    return timings
+
+
+if __name__ == "__main__":
+    prefetch()
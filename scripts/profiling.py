@@ -0,0 +1,203 @@
+import argparse
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+from scripts import config
+from scripts.logger import logger
+
+# Seconds between two samples of the profiled thread
+INTERVAL: float = 0.005
+
+# Number of functions listed in the hot-function table
+TOP_N: int = 25
+
+_state = threading.local()
+
+
+def is_enabled() -> bool:
+    """Profiling is on with HEALTH_ODA_PROFILE=1."""
+    return os.environ.get("HEALTH_ODA_PROFILE") == "1"
+
+
+def parse_profile_flag(argv: Optional[list[str]] = None) -> None:
+    """Turn profiling on if a script is run with --profile.
+
+    Only call this from a module's `__main__` block, so that a host process
+    with its own command line is never affected.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--profile", action="store_true", help="write profiles to output/_profiles"
+    )
+    if parser.parse_args(argv).profile:
+        os.environ["HEALTH_ODA_PROFILE"] = "1"
+
+
+class _Sampler(threading.Thread):
+    """Periodically records the call stack of another thread."""
+
+    def __init__(self, thread_id: int, interval: float = INTERVAL) -> None:
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: list[tuple] = []
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            # Root first, as expected by flamegraph tools
+            self.samples.append(tuple(reversed(stack)))
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+def _jsonable(params: dict) -> dict:
+    """Keep the run parameters that can be written to JSON."""
+    clean = {}
+    for name, value in params.items():
+        if isinstance(value, range):
+            value = [value.start, value.stop - 1]
+        try:
+            json.dumps(value)
+        except TypeError:
+            value = repr(value)
+        clean[name] = value
+
+    return clean
+
+
+def _speedscope(name: str, stacks: Counter, duration: float, params: dict) -> dict:
+    """Build a speedscope 'sampled' profile from the recorded stacks."""
+    frames, index = [], {}
+    samples, weights = [], []
+
+    for stack, count in stacks.items():
+        ids = []
+        for frame in stack:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+            ids.append(index[frame])
+        samples.append(ids)
+        weights.append(count * INTERVAL)
+
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": f"{name} {json.dumps(params)}",
+        "exporter": "health_oda",
+        "shared": {"frames": frames},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": duration,
+                "samples": samples,
+                "weights": weights,
+            }
+        ],
+    }
+
+
+def _hot_functions(stacks: Counter) -> list[dict]:
+    """Samples spent in each function (self) and under it (total)."""
+    own, total = Counter(), Counter()
+    for stack, count in stacks.items():
+        own[stack[-1]] += count
+        for frame in set(stack):
+            total[frame] += count
+
+    return [
+        {
+            "function": f"{frame[0]} ({Path(frame[1]).name}:{frame[2]})",
+            "self": own[frame],
+            "total": total[frame],
+        }
+        for frame, _ in total.most_common(TOP_N)
+    ]
+
+
+def _write_report(name: str, stacks: Counter, duration: float, params: dict) -> Path:
+    folder = config.Paths.output / "_profiles"
+    folder.mkdir(parents=True, exist_ok=True)
+    stem = f"{name}_{datetime.now():%Y%m%d_%H%M%S_%f}"
+
+    speedscope = _speedscope(name, stacks, duration, params)
+    (folder / f"{stem}.speedscope.json").write_text(json.dumps(speedscope))
+
+    report = {
+        "entry_point": name,
+        "params": params,
+        "duration": duration,
+        "samples": sum(stacks.values()),
+        "hot_functions": _hot_functions(stacks),
+    }
+    (folder / f"{stem}.json").write_text(json.dumps(report, indent=2))
+
+    table = "\n".join(
+        f"{f['total']:>8} {f['self']:>8}  {f['function']}"
+        for f in report["hot_functions"]
+    )
+    logger.info(f"Profile of {name} ({duration:.1f}s)\n   total     self\n{table}")
+
+    return folder / stem
+
+
+def profiled(func: Callable) -> Callable:
+    """Profile calls to an entry point when profiling is enabled.
+
+    The outermost profiled call in a thread starts a sampler. Entry points called
+    from it share that sampler, and each gets a report of the samples taken
+    while it ran.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not is_enabled():
+            return func(*args, **kwargs)
+
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+
+        sampler = getattr(_state, "sampler", None)
+        outermost = sampler is None
+        if outermost:
+            sampler = _state.sampler = _Sampler(threading.get_ident())
+            sampler.start()
+
+        first = len(sampler.samples)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            if outermost:
+                sampler.stop()
+                _state.sampler = None
+            _write_report(
+                func.__name__,
+                Counter(sampler.samples[first:]),
+                duration,
+                _jsonable(bound.arguments),
+            )
+
+    return wrapper
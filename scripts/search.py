@@ -0,0 +1,226 @@
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from scripts import config
+from scripts.cache import crs_version
+from scripts.common import get_health_oda_indicator
+from scripts.logger import logger
+
+TOKEN: str = r"[a-z0-9]+"
+
+ROW_COLUMNS: list = [
+    "year",
+    "donor_code",
+    "recipient_code",
+    "purpose_code",
+    "project_title",
+    "keywords",
+    "value",
+]
+
+
+def tokenize(text: pd.Series) -> pd.Series:
+    """Split text into lower case alphanumeric tokens (one list per row)."""
+    return text.fillna("").str.lower().str.findall(TOKEN)
+
+
+def _postings(rows: pd.DataFrame) -> pa.Table:
+    """Build the token -> row ids postings for one year of data.
+
+    Row ids are stored sorted and delta encoded, so that they compress well.
+    """
+    tokens = tokenize(rows.project_title + " " + rows.keywords.fillna("")).explode()
+    tokens = tokens.dropna()
+
+    pairs = (
+        pd.DataFrame({"token": tokens.to_numpy(str), "row": tokens.index.to_numpy()})
+        .drop_duplicates()
+        .sort_values(["token", "row"])
+    )
+
+    vocabulary, starts = np.unique(pairs.token.to_numpy(), return_index=True)
+    row_ids = pairs.row.to_numpy(np.uint32)
+
+    # Delta encode each postings list: the first id, then the gaps between ids
+    deltas = np.diff(row_ids, prepend=np.uint32(0))
+    deltas[starts] = row_ids[starts]
+
+    offsets = np.append(starts, len(row_ids)).astype(np.int32)
+
+    return pa.table(
+        {
+            "token": pa.array(vocabulary),
+            "row_ids": pa.ListArray.from_arrays(offsets, pa.array(deltas)),
+        }
+    )
+
+
+def build_project_index(
+    start_year: int = 2000,
+    end_year: int = 2023,
+    prices: str = "current",
+    currency: str = "USD",
+    base_year: Optional[int] = None,
+    folder: Optional[Path] = None,
+) -> Path:
+    """Build a token-level inverted index over health project titles and keywords.
+
+    For each year, the health-filtered bilateral CRS rows and an index of
+    token -> row ids are saved to `raw_data/search_index`. The manifest records
+    the version of the raw CRS file, so that searches can tell when it changed.
+    """
+    folder = Path(folder or config.Paths.search_index)
+    folder.mkdir(parents=True, exist_ok=True)
+
+    data = get_health_oda_indicator(
+        indicator="crs_bilateral_flow_disbursement_gross",
+        start_year=start_year,
+        end_year=end_year,
+        prices=prices,
+        currency=currency,
+        base_year=base_year,
+    ).filter(ROW_COLUMNS)
+
+    data = data.assign(project_title=data.project_title.fillna("").astype(str))
+
+    for year, rows in data.groupby("year"):
+        rows = rows.reset_index(drop=True)
+        rows.to_parquet(folder / f"rows_{year}.parquet", index=False)
+        pq.write_table(
+            _postings(rows), folder / f"index_{year}.parquet", compression="zstd"
+        )
+
+    manifest = {
+        "years": sorted(int(y) for y in data.year.unique()),
+        "start_year": start_year,
+        "end_year": end_year,
+        "prices": prices,
+        "currency": currency,
+        "base_year": base_year,
+        "crs_version": crs_version(),
+    }
+    (folder / "manifest.json").write_text(json.dumps(manifest, indent=2))
+
+    return folder
+
+
+def _read_manifest(folder: Path) -> dict:
+    """Return the index manifest, rebuilding the index if the CRS has changed."""
+    manifest = json.loads((folder / "manifest.json").read_text())
+
+    if manifest.get("crs_version") != crs_version():
+        logger.info("The CRS has changed since the search index was built. Rebuilding.")
+        build_project_index(
+            start_year=manifest.get("start_year", min(manifest["years"])),
+            end_year=manifest.get("end_year", max(manifest["years"])),
+            prices=manifest["prices"],
+            currency=manifest["currency"],
+            base_year=manifest["base_year"],
+            folder=folder,
+        )
+        manifest = json.loads((folder / "manifest.json").read_text())
+
+    return manifest
+
+
+@lru_cache(maxsize=None)
+def _load_year(folder: Path, year: int, mtime: float) -> tuple:
+    """Load the rows and index of one year. Cached until the index is rebuilt."""
+    rows = pd.read_parquet(folder / f"rows_{year}.parquet")
+    index = pq.read_table(folder / f"index_{year}.parquet")
+
+    tokens = index.column("token").to_numpy()
+    postings = index.column("row_ids").combine_chunks()
+
+    return rows, tokens, postings
+
+
+def _rows_for_token(tokens: np.ndarray, postings: pa.ListArray, token: str):
+    """Return the row ids for a token, or for all tokens with a prefix ('vacc*')."""
+    if token.endswith("*"):
+        prefix = token[:-1]
+        start = np.searchsorted(tokens, prefix, side="left")
+        end = np.searchsorted(tokens, prefix + "\uffff", side="left")
+    else:
+        start = np.searchsorted(tokens, token, side="left")
+        end = start + int(start < len(tokens) and tokens[start] == token)
+
+    ids = [np.cumsum(postings[i].values.to_numpy()) for i in range(start, end)]
+
+    return np.unique(np.concatenate(ids)) if ids else np.array([], dtype=np.uint32)
+
+
+def _matching_rows(tokens: np.ndarray, postings: pa.ListArray, terms: list[str]):
+    """Rows that match any of the terms. All the words in a term must match."""
+    matches = []
+    for term in terms:
+        words = re.findall(TOKEN + r"\*?", term.lower())
+        if not words:
+            continue
+        ids = _rows_for_token(tokens, postings, words[0])
+        for word in words[1:]:
+            ids = np.intersect1d(ids, _rows_for_token(tokens, postings, word))
+        matches.append(ids)
+
+    return np.unique(np.concatenate(matches)) if matches else np.array([], dtype=int)
+
+
+def search_health_projects(
+    terms: str | list[str],
+    years: Optional[list[int] | range] = None,
+    donors: Optional[list[int]] = None,
+    by: Optional[list[str]] = None,
+    folder: Optional[Path] = None,
+) -> pd.DataFrame:
+    """Sum the value of health projects whose title or keywords mention any of the terms.
+
+    Args:
+        terms: a term or list of terms, e.g. ["vaccine*", "malaria", "gavi"]. Words
+            in a term must all appear in the project. A trailing '*' matches any
+            word starting with that prefix.
+        years: the years to search. Defaults to all the years in the index.
+        donors: the donor codes to keep. Defaults to all donors.
+        by: the columns to group the results by. Defaults to year and donor_code.
+        folder: the folder where the index was built. The index is rebuilt with
+            the same parameters if the raw CRS file has changed since.
+
+    Returns:
+        A dataframe with the summed value of the matching projects.
+    """
+    folder = Path(folder or config.Paths.search_index)
+    terms = [terms] if isinstance(terms, str) else terms
+    by = by or ["year", "donor_code"]
+
+    manifest = _read_manifest(folder)
+    years = manifest["years"] if years is None else years
+
+    results = []
+    for year in years:
+        path = folder / f"index_{year}.parquet"
+        if not path.exists():
+            continue
+
+        rows, tokens, postings = _load_year(folder, year, path.stat().st_mtime)
+        matches = rows.iloc[_matching_rows(tokens, postings, terms)]
+
+        if donors is not None:
+            matches = matches.loc[lambda d: d.donor_code.isin(donors)]
+
+        results.append(matches)
+
+    if not results:
+        return pd.DataFrame(columns=by + ["value"])
+
+    return (
+        pd.concat(results, ignore_index=True)
+        .groupby(by, dropna=False, observed=True, as_index=False)["value"]
+        .sum()
+    )
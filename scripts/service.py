@@ -0,0 +1,392 @@
+"""Local query service over precomputed health ODA aggregates.
+
+    python -m scripts.service build --start-year 2008 --end-year 2023 --base-year 2023
+    python -m scripts.service serve --port 8765
+
+`build` saves the aggregates under raw_data/service/<prices>_<base_year>. `serve`
+loads every saved set into memory and answers slice queries over HTTP:
+
+    GET /datasets
+    GET /query?dataset=bilateral&year=2020,2021&donor_code=4&by=year,indicator
+    GET /query?dataset=recipient_groups&start_year=2015&format=arrow
+"""
+
+import argparse
+import json
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from scripts import config
+from scripts.export import write_atomic
+from scripts.logger import logger
+
+# Columns that can be used to filter and group a dataset
+DIMENSIONS: list = [
+    "year",
+    "donor_code",
+    "recipient_code",
+    "recipient",
+    "indicator",
+    "prices",
+]
+
+INDICATORS: dict = {False: "Health ODA (including COVID-19)", True: "Health ODA"}
+
+FORMATS: dict = {
+    "json": "application/json",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+CACHE_SIZE: int = 4096
+
+# Serialising JSON is slow, so larger results must be requested as Arrow
+MAX_JSON_ROWS: int = 10_000
+
+
+def _with_and_without_covid(func, **kwargs) -> pd.DataFrame:
+    return pd.concat(
+        [
+            func(exclude_covid=exclude, **kwargs).assign(indicator=name)
+            for exclude, name in INDICATORS.items()
+        ],
+        ignore_index=True,
+    )
+
+
+def build_aggregates(
+    start_year: int = 2008,
+    end_year: int = 2023,
+    prices: str = "constant",
+    base_year: int = 2023,
+    engine: str = "pandas",
+) -> Path:
+    """Compute the aggregates served by the query service and save them."""
+    from scripts.all_donors_recipient_groupings import health_with_and_without_covid
+    from scripts.bilateral import get_bilateral_health_oda
+    from scripts.imputed_multilateral import get_imputed_multilateral_health_oda
+
+    params = {
+        "start_year": start_year,
+        "end_year": end_year,
+        "prices": prices,
+        "base_year": base_year,
+        "engine": engine,
+    }
+
+    groups = health_with_and_without_covid(**params).melt(
+        id_vars=["year", "recipient"], var_name="indicator", value_name="value"
+    )
+
+    datasets = {
+        "bilateral": _with_and_without_covid(
+            get_bilateral_health_oda, by_recipient=True, **params
+        ),
+        "imputed_multilateral": _with_and_without_covid(
+            get_imputed_multilateral_health_oda, by_recipient=True, **params
+        ),
+        "recipient_groups": groups.dropna(subset=["value"]),
+    }
+
+    folder = config.Paths.service / f"{prices}_{base_year}"
+    folder.mkdir(parents=True, exist_ok=True)
+
+    for name, data in datasets.items():
+        write_atomic(data, folder / f"{name}.parquet", fmt="parquet")
+
+    (folder / "manifest.json").write_text(json.dumps(params, indent=2))
+
+    return folder
+
+
+class Dataset:
+    """An aggregate held in memory, with an index of row positions per dimension.
+
+    Each dimension is also stored as integer codes into its sorted keys, so that
+    grouping only needs numpy.
+    """
+
+    def __init__(self, data: pd.DataFrame) -> None:
+        self.dimensions = [c for c in DIMENSIONS if c in data.columns]
+        data = data.sort_values(self.dimensions, ignore_index=True)
+        self.data = data.astype(
+            {c: "category" for c in self.dimensions if data[c].dtype == object}
+        )
+        self.values = np.nan_to_num(self.data["value"].to_numpy(dtype=float))
+
+        self.index, self.codes, self.keys = {}, {}, {}
+        for column in self.dimensions:
+            # Missing keys get a code of their own, after the sorted keys
+            codes, keys = pd.factorize(
+                self.data[column], sort=True, use_na_sentinel=False
+            )
+            rows = np.split(
+                np.argsort(codes, kind="stable"), np.cumsum(np.bincount(codes))[:-1]
+            )
+
+            # A missing key can be grouped by, but not selected in a query
+            self.index[column] = {
+                k: r for k, r in zip(keys.tolist(), rows) if not pd.isna(k)
+            }
+            self.codes[column] = codes
+            self.keys[column] = keys
+
+    def rows(self, filters: dict[str, list]) -> Optional[np.ndarray]:
+        """The sorted positions of the rows matching all the filters."""
+        selected = None
+        for column, values in filters.items():
+            index = self.index[column]
+            matches = [index[v] for v in values if v in index]
+            rows = np.sort(np.concatenate(matches)) if matches else np.array([], int)
+            selected = (
+                rows
+                if selected is None
+                else np.intersect1d(selected, rows, assume_unique=True)
+            )
+
+        return selected
+
+    def select(self, filters: dict[str, list], by: list[str]) -> pd.DataFrame:
+        rows = self.rows(filters)
+
+        if not by:
+            return self.data if rows is None else self.data.take(rows)
+
+        rows = np.arange(len(self.data)) if rows is None else rows
+        codes = [self.codes[column][rows] for column in by]
+        shape = [len(self.keys[column]) for column in by]
+
+        flat = np.ravel_multi_index(codes, shape)
+        size = int(np.prod(shape))
+
+        # Sum into every possible group when there are few, otherwise sort
+        if size <= max(8 * len(rows), 2**16):
+            counts = np.bincount(flat, minlength=size)
+            groups = np.flatnonzero(counts)
+            totals = np.bincount(flat, weights=self.values[rows], minlength=size)
+            totals = totals[groups]
+        else:
+            groups, inverse = np.unique(flat, return_inverse=True)
+            totals = np.bincount(inverse, weights=self.values[rows])
+
+        data = {
+            column: self.keys[column].take(keys).array
+            for column, keys in zip(by, np.unravel_index(groups, shape))
+        }
+
+        return pd.DataFrame({**data, "value": totals})
+
+
+class QueryService:
+    """Answers slice queries over the saved aggregates, caching the responses."""
+
+    def __init__(self, folder: Optional[Path] = None) -> None:
+        folder = Path(folder or config.Paths.service)
+        self.datasets: dict[tuple, Dataset] = {}
+
+        for manifest in sorted(folder.glob("*/manifest.json")):
+            params = json.loads(manifest.read_text())
+            for path in manifest.parent.glob("*.parquet"):
+                key = (path.stem, params["prices"], params["base_year"])
+                self.datasets[key] = Dataset(pd.read_parquet(path))
+
+        if not self.datasets:
+            raise FileNotFoundError(f"No aggregates in {folder}. Run `build` first.")
+
+        self.respond = lru_cache(maxsize=CACHE_SIZE)(self._respond)
+
+        # The full datasets are the largest responses, so render them up front
+        for name, prices, base_year in self.datasets:
+            self.respond(name, prices, base_year, (), (), "arrow")
+
+    def describe(self) -> list[dict]:
+        return [
+            {
+                "dataset": name,
+                "prices": prices,
+                "base_year": base_year,
+                "rows": len(dataset.data),
+                "dimensions": {
+                    column: sorted(index) for column, index in dataset.index.items()
+                },
+            }
+            for (name, prices, base_year), dataset in self.datasets.items()
+        ]
+
+    def _resolve(
+        self, name: str, prices: Optional[str], base_year: Optional[int]
+    ) -> tuple:
+        """The (dataset, prices, base year) key, using the latest set if unspecified."""
+        matches = [
+            key
+            for key in self.datasets
+            if key[0] == name
+            and prices in (None, key[1])
+            and base_year in (None, key[2])
+        ]
+        if not matches:
+            raise KeyError(f"No '{name}' aggregates for {prices} {base_year} prices")
+
+        return matches[-1]
+
+    def parse(self, query: str) -> tuple:
+        """Turn a query string into a normalised, hashable query."""
+        params = dict(parse_qsl(query))
+
+        name = params.pop("dataset", "bilateral")
+        fmt = params.pop("format", "json")
+        prices = params.pop("prices", None)
+        base_year = params.pop("base_year", None)
+        base_year = int(base_year) if base_year else None
+        by = tuple(c for c in params.pop("by", "").split(",") if c)
+
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format '{fmt}'")
+
+        name, prices, base_year = self._resolve(name, prices, base_year)
+        dataset = self.datasets[(name, prices, base_year)]
+
+        start, end = params.pop("start_year", None), params.pop("end_year", None)
+
+        filters = {}
+        for column, values in params.items():
+            if column not in dataset.dimensions:
+                raise ValueError(f"Unknown parameter '{column}'")
+            # Parse the values as the type of the indexed keys
+            cast = type(next(iter(dataset.index[column]), ""))
+            filters[column] = {cast(v) for v in values.split(",")}
+
+        if start or end:
+            years = {
+                y
+                for y in dataset.index["year"]
+                if int(start or y) <= y <= int(end or y)
+            }
+            filters["year"] = filters.get("year", years) & years
+
+        filters = tuple((c, tuple(sorted(v))) for c, v in sorted(filters.items()))
+
+        unknown = set(by) - set(dataset.dimensions)
+        if unknown:
+            raise ValueError(f"Cannot group by {sorted(unknown)}")
+
+        return name, prices, base_year, filters, by, fmt
+
+    def _respond(
+        self,
+        name: str,
+        prices: str,
+        base_year: int,
+        filters: tuple,
+        by: tuple,
+        fmt: str,
+    ) -> bytes:
+        data = self.datasets[(name, prices, base_year)].select(dict(filters), list(by))
+
+        if fmt == "json" and len(data) > MAX_JSON_ROWS:
+            raise ValueError(
+                f"{len(data)} rows is too many for JSON. "
+                "Narrow the query, group it with `by`, or use format=arrow."
+            )
+
+        if fmt == "arrow":
+            table = pa.Table.from_pandas(data, preserve_index=False)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return sink.getvalue().to_pybytes()
+
+        return data.to_json(orient="records").encode()
+
+
+def _handler(service: QueryService) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        # Keep connections open between requests
+        protocol_version = "HTTP/1.1"
+        # Headers and body are separate writes; don't let them wait for an ACK
+        disable_nagle_algorithm = True
+
+        def _send(self, status: int, body: bytes, content_type: str) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            url = urlsplit(self.path)
+            try:
+                if url.path == "/datasets":
+                    body = json.dumps(service.describe()).encode()
+                    self._send(200, body, FORMATS["json"])
+                elif url.path == "/query":
+                    query = service.parse(url.query)
+                    self._send(200, service.respond(*query), FORMATS[query[-1]])
+                else:
+                    self._send(404, b'{"error": "Not found"}', FORMATS["json"])
+            except (KeyError, ValueError) as e:
+                body = json.dumps({"error": e.args[0]}).encode()
+                self._send(400, body, FORMATS["json"])
+
+        def log_message(self, format: str, *args) -> None:
+            # Logging every request would dominate the response time
+            pass
+
+    return Handler
+
+
+def serve(
+    host: str = "127.0.0.1", port: int = 8765, folder: Optional[Path] = None
+) -> None:
+    service = QueryService(folder)
+    server = ThreadingHTTPServer((host, port), _handler(service))
+    server.daemon_threads = True
+
+    logger.info(f"Serving {len(service.datasets)} aggregates on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="compute and save the aggregates")
+    build.add_argument("--start-year", type=int, default=2008)
+    build.add_argument("--end-year", type=int, default=2023)
+    build.add_argument("--prices", default="constant")
+    build.add_argument("--base-year", type=int, default=2023)
+    build.add_argument("--engine", default="pandas")
+
+    run = commands.add_parser("serve", help="serve the saved aggregates")
+    run.add_argument("--host", default="127.0.0.1")
+    run.add_argument("--port", type=int, default=8765)
+    run.add_argument("--folder", type=Path)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        build_aggregates(
+            start_year=args.start_year,
+            end_year=args.end_year,
+            prices=args.prices,
+            base_year=args.base_year,
+            engine=args.engine,
+        )
+    else:
+        serve(args.host, args.port, args.folder)
+
+
+if __name__ == "__main__":
+    main()
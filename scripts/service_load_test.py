@@ -0,0 +1,157 @@
+"""Load test for the local query service.
+
+    python -m scripts.service serve &
+    python -m scripts.service_load_test --duration 30 --concurrency 4
+
+Fires random slice queries at the service from several connections and reports
+the latency percentiles. Exits with an error if the p99 is over the target.
+"""
+
+import argparse
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+from scripts.logger import logger
+from scripts.service import MAX_JSON_ROWS
+
+# Share of queries repeating an earlier one, as dashboards re-request slices
+REPEAT_SHARE: float = 0.5
+
+
+def random_query(datasets: list[dict], rng: random.Random) -> str:
+    """A slice query over random dimension values of a random dataset.
+
+    Like a dashboard, it asks for Arrow when the result may be too large for JSON.
+    """
+    dataset = rng.choice(datasets)
+    dimensions = dataset["dimensions"]
+    query = {"dataset": dataset["dataset"], "prices": dataset["prices"]}
+    # Current prices have no base year, and the service reads a missing one as None
+    if dataset["base_year"] is not None:
+        query["base_year"] = dataset["base_year"]
+
+    # Upper bound on the number of rows returned
+    rows = dataset["rows"]
+    selected = {column: len(keys) for column, keys in dimensions.items()}
+
+    for column in rng.sample(list(dimensions), k=rng.randint(0, 2)):
+        if column == "year":
+            first = rng.choice(dimensions["year"])
+            query["start_year"] = first
+            query["end_year"] = first + rng.randint(0, 5)
+            selected["year"] = 6
+        else:
+            values = rng.sample(dimensions[column], k=min(3, len(dimensions[column])))
+            query[column] = ",".join(map(str, values))
+            selected[column] = len(values)
+        rows = rows * selected[column] // len(dimensions[column])
+
+    by = [c for c in dimensions if rng.random() < 0.4]
+    if by:
+        query["by"] = ",".join(by)
+        rows = min(rows, int(np.prod([selected[c] for c in by])))
+
+    query["format"] = "json" if rows <= MAX_JSON_ROWS else "arrow"
+
+    return "/query?" + urlencode(query)
+
+
+def _worker(
+    host: str,
+    port: int,
+    datasets: list[dict],
+    deadline: float,
+    seed: int,
+    latencies: list,
+    errors: list,
+) -> None:
+    rng = random.Random(seed)
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    history = []
+
+    while time.perf_counter() < deadline:
+        if history and rng.random() < REPEAT_SHARE:
+            path = rng.choice(history)
+        else:
+            path = random_query(datasets, rng)
+            history.append(path)
+
+        start = time.perf_counter()
+        connection.request("GET", path)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+
+        if response.status != 200:
+            errors.append((response.status, path))
+
+    connection.close()
+
+
+def run_load_test(
+    url: str = "http://127.0.0.1:8765",
+    duration: float = 10,
+    concurrency: int = 4,
+    seed: int = 0,
+) -> dict:
+    """Query the service for `duration` seconds and summarise the latencies (ms)."""
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=10)
+    connection.request("GET", "/datasets")
+    datasets = json.loads(connection.getresponse().read())
+    connection.close()
+
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(
+            target=_worker,
+            args=(parts.hostname, parts.port, datasets, deadline, seed + i),
+            kwargs={"latencies": latencies, "errors": errors},
+        )
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    ms = np.array(latencies) * 1000
+
+    return {
+        "requests": len(ms),
+        "errors": len(errors),
+        "requests_per_second": len(ms) / duration,
+        "p50": float(np.percentile(ms, 50)),
+        "p95": float(np.percentile(ms, 95)),
+        "p99": float(np.percentile(ms, 99)),
+        "max": float(ms.max()),
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--target-p99", type=float, default=50, help="milliseconds")
+    args = parser.parse_args(argv)
+
+    results = run_load_test(args.url, args.duration, args.concurrency, args.seed)
+    logger.info(json.dumps(results, indent=2))
+
+    if results["errors"] or results["p99"] > args.target_p99:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from importlib.metadata import version
+from pathlib import Path
+from typing import Callable, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from filelock import FileLock
+
+from scripts import config
+from scripts.aggregate import parse_memory
+
+# Bump when the layout of the snapshot changes
+SNAPSHOT_VERSION: int = 2
+
+# Snapshots are discarded when any of these packages is upgraded
+PACKAGES: tuple = ("oda-data", "bblocks", "pandas", "pyarrow")
+
+MANIFEST: str = "manifest.json"
+
+# Memory for the intermediates of a session. Beyond it, the least recently used
+# are dropped
+MAX_MEMORY: str = "4GB"
+
+
+def _package_versions() -> dict:
+    return {package: version(package) for package in PACKAGES}
+
+
+def _read_table(folder: Path, name: str) -> pd.DataFrame:
+    source = pa.memory_map(str(folder / f"{name}.arrow"), "r")
+    return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def _write_manifest(folder: Path, manifest: dict) -> None:
+    tmp = folder / f"{MANIFEST}.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, folder / MANIFEST)
+
+
+def _groupings_to_frame(groupings: dict) -> pd.DataFrame:
+    """Turn a {group: {code: name}} dictionary into a long table."""
+    return pd.DataFrame(
+        [
+            (group, code, name)
+            for group, members in groupings.items()
+            for code, name in members.items()
+        ],
+        columns=["group", "code", "name"],
+    )
+
+
+class HealthOdaSession:
+    """Resolved dimension tables and hot intermediates for a working session.
+
+    A session can be saved as a snapshot (Arrow files plus a JSON manifest) and
+    restored in a fresh Python process without importing oda_data or bblocks.
+    The pipeline uses the session returned by `get_session`.
+    """
+
+    def __init__(
+        self,
+        recipient_groups: pd.DataFrame,
+        donor_groups: pd.DataFrame,
+        income_levels: pd.DataFrame,
+        intermediates: Optional[dict[str, pd.DataFrame]] = None,
+        max_memory: str | int = MAX_MEMORY,
+    ) -> None:
+        self.recipient_groups = recipient_groups
+        self.donor_groups = donor_groups
+        self.income_levels = income_levels
+        self.intermediates = intermediates or {}
+        self.max_memory = parse_memory(max_memory)
+        self.sizes: dict = {}
+
+        # The version of every intermediate, including those saved in the
+        # snapshot but not read yet, and the snapshot folder
+        self.versions: dict = {name: None for name in self.intermediates}
+        self.folder: Optional[Path] = None
+
+    @classmethod
+    def build(cls) -> "HealthOdaSession":
+        """Resolve the dimension tables from oda_data and bblocks."""
+        from oda_data import donor_groupings, recipient_groupings
+
+        from scripts.common import bblocks_income_grouping
+
+        recipients = _groupings_to_frame(recipient_groupings())
+        donors = _groupings_to_frame(donor_groupings())
+
+        income_levels = bblocks_income_grouping(
+            pd.DataFrame(
+                {"recipient_code": recipients.code.drop_duplicates().sort_values()}
+            )
+        ).reset_index(drop=True)
+
+        return cls(recipients, donors, income_levels)
+
+    def recipient_group(self, name: str) -> dict:
+        """Return a recipient grouping as a {code: name} dictionary."""
+        group = self.recipient_groups.loc[lambda d: d.group == name]
+        return dict(zip(group.code, group.name))
+
+    def donor_group(self, name: str) -> dict:
+        """Return a donor grouping as a {code: name} dictionary."""
+        group = self.donor_groups.loc[lambda d: d.group == name]
+        return dict(zip(group.code, group.name))
+
+    def add_income_level(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Add an `income_level` column for the `recipient_code` of each row."""
+        levels = dict(
+            zip(self.income_levels.recipient_code, self.income_levels.income_level)
+        )
+        return df.assign(income_level=df.recipient_code.map(levels))
+
+    def intermediate(
+        self, name: str, func: Callable, version=None, **kwargs
+    ) -> pd.DataFrame:
+        """Return a named intermediate, computing it with `func(**kwargs)` if needed.
+
+        Intermediates saved in the snapshot are read on first use. One saved with
+        another `version` (e.g. the modification time of its source file) is
+        computed again. New intermediates are added to the snapshot. Once the
+        intermediates in memory take more than `max_memory`, the least recently
+        used are dropped.
+        """
+        if name in self.versions and self.versions[name] != version:
+            self.intermediates.pop(name, None)
+            self.sizes.pop(name, None)
+            del self.versions[name]
+
+        if name not in self.intermediates and name in self.versions:
+            self.intermediates[name] = _read_table(self.folder, f"intermediate_{name}")
+
+        if name not in self.intermediates:
+            self.intermediates[name] = func(**kwargs)
+            self.versions[name] = version
+            if self.folder is not None:
+                self._add_to_snapshot(name)
+
+        # Keep the intermediates in order of use, the most recent last
+        self.intermediates[name] = self.intermediates.pop(name)
+        self._evict()
+
+        return self.intermediates[name]
+
+    def _evict(self) -> None:
+        """Drop the least recently used intermediates while over `max_memory`.
+
+        Those in the snapshot are read again when next used. The others are
+        computed again.
+        """
+        for name, df in self.intermediates.items():
+            if name not in self.sizes:
+                self.sizes[name] = int(df.memory_usage(deep=True).sum())
+
+        while (
+            len(self.intermediates) > 1
+            and sum(self.sizes[n] for n in self.intermediates) > self.max_memory
+        ):
+            name = next(iter(self.intermediates))
+            del self.intermediates[name]
+            del self.sizes[name]
+            if self.folder is None:
+                del self.versions[name]
+
+    def _add_to_snapshot(self, name: str) -> None:
+        path = self.folder / f"intermediate_{name}.arrow"
+        tmp = path.with_suffix(".tmp")
+        feather.write_feather(self.intermediates[name], tmp, compression="uncompressed")
+
+        # Other processes may be adding intermediates to the same snapshot
+        with FileLock(str(self.folder / ".lock")):
+            os.replace(tmp, path)
+            manifest = json.loads((self.folder / MANIFEST).read_text())
+            manifest["intermediates"][name] = self.versions[name]
+            _write_manifest(self.folder, manifest)
+
+    def save(self, folder: Optional[Path] = None) -> Path:
+        """Save the session as a versioned snapshot."""
+        folder = Path(folder or config.Paths.session)
+        tmp = folder.with_name(f".{folder.name}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+
+        tables = {
+            "recipient_groups": self.recipient_groups,
+            "donor_groups": self.donor_groups,
+            "income_levels": self.income_levels,
+        } | {
+            f"intermediate_{name}": self.intermediate(name, None, version)
+            for name, version in list(self.versions.items())
+        }
+
+        for name, df in tables.items():
+            # Uncompressed, so that restoring can memory map the files
+            feather.write_feather(df, tmp / f"{name}.arrow", compression="uncompressed")
+
+        manifest = {
+            "version": SNAPSHOT_VERSION,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "packages": _package_versions(),
+            "tables": list(tables),
+            "intermediates": self.versions,
+        }
+        _write_manifest(tmp, manifest)
+
+        # Swap the new snapshot into place
+        shutil.rmtree(folder, ignore_errors=True)
+        os.replace(tmp, folder)
+        self.folder = folder
+
+        return folder
+
+    @classmethod
+    def restore(cls, folder: Optional[Path] = None) -> "HealthOdaSession":
+        """Restore a session from a snapshot.
+
+        Raises:
+            FileNotFoundError: if there is no snapshot.
+            ValueError: if the snapshot is from another version or package set.
+        """
+        folder = Path(folder or config.Paths.session)
+        manifest = json.loads((folder / MANIFEST).read_text())
+
+        if manifest["version"] != SNAPSHOT_VERSION:
+            raise ValueError(f"Snapshot version {manifest['version']} is outdated")
+
+        if manifest["packages"] != _package_versions():
+            raise ValueError("Snapshot was created with different package versions")
+
+        session = cls(
+            recipient_groups=_read_table(folder, "recipient_groups"),
+            donor_groups=_read_table(folder, "donor_groups"),
+            income_levels=_read_table(folder, "income_levels"),
+        )
+
+        # Intermediates (e.g. the CRS) can be large, so they are read when needed
+        session.versions = dict(manifest["intermediates"])
+        session.folder = folder
+
+        return session
+
+    @classmethod
+    def load(cls, folder: Optional[Path] = None) -> "HealthOdaSession":
+        """Restore the snapshot if it is valid, otherwise build and save a new one."""
+        try:
+            return cls.restore(folder)
+        except (FileNotFoundError, ValueError):
+            session = cls.build()
+            session.save(folder)
+            return session
+
+
+_session: Optional[HealthOdaSession] = None
+
+
+def get_session() -> HealthOdaSession:
+    """The session of this process, restored from its snapshot on first use."""
+    global _session
+    if _session is None:
+        _session = HealthOdaSession.load()
+
+    return _session
+
+
+def benchmark() -> dict:
+    """Time a cold start against a snapshot restore, each in a fresh interpreter."""
+    timings = {}
+    for name, statement in {
+        "cold": "HealthOdaSession.build()",
+        "snapshot": "HealthOdaSession.restore()",
+    }.items():
+        start = time.perf_counter()
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                f"from scripts.session import HealthOdaSession; {statement}",
+            ],
+            cwd=config.Paths.project,
+            check=True,
+        )
+        timings[name] = time.perf_counter() - start
+
+    return timings
+
+
+if __name__ == "__main__":
+    HealthOdaSession.load()
+    print(benchmark())
@@ -0,0 +1,275 @@
+"""Sharded (map-reduce) execution of the bilateral + multilateral donor exports.
+
+A plan splits the work into shards of (year range, donor set, currency). Each
+shard can run on any machine and writes a partial aggregate plus a manifest to
+a scratch folder. A merge then combines the partials into the final outputs.
+
+    python -m scripts.sharding plan --start-year 2008 --end-year 2023 --plan plan.json
+    python -m scripts.sharding run --plan plan.json --shard s000 --scratch /tmp/s000
+    python -m scripts.sharding merge --plan plan.json --scratch /tmp/s000 /tmp/s001
+
+`local` runs every shard in its own process and scratch folder, then merges them.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+from scripts.aggregate import groupby_sum
+from scripts.donors_all_recipients import (
+    DONORS,
+    reshape_for_export,
+    total_bi_plus_multi_health_spending,
+    write_export,
+)
+from scripts.export import write_atomic
+from scripts.imputed_multilateral import IMPUTATION_LOOKBACK
+
+GROUPER: list = ["currency", "year", "donor_code", "prices", "indicator"]
+
+
+@dataclass
+class Shard:
+    """A unit of work: a range of years for a set of donors, in one currency."""
+
+    shard_id: str
+    start_year: int
+    end_year: int
+    donors: list[int]
+    currency: str
+
+    @property
+    def load_start_year(self) -> int:
+        """The first year of data the shard reads, including the imputation lookback.
+
+        `get_imputed_multilateral_health_oda` loads these extra years itself and
+        drops them from its output, so shards never double count boundary years.
+        """
+        return self.start_year - IMPUTATION_LOOKBACK
+
+
+def plan_shards(
+    start_year: int,
+    end_year: int,
+    donors: list[int],
+    currencies: list[str] = ("USD",),
+    years_per_shard: int = 5,
+    donors_per_shard: Optional[int] = None,
+) -> list[Shard]:
+    """Split a run into (year range, donor set, currency) shards."""
+    donors = sorted(set(donors))
+    donors_per_shard = donors_per_shard or len(donors)
+
+    shards = []
+    for currency in currencies:
+        for first in range(start_year, end_year + 1, years_per_shard):
+            last = min(first + years_per_shard - 1, end_year)
+            for i in range(0, len(donors), donors_per_shard):
+                shards.append(
+                    Shard(
+                        shard_id=f"s{len(shards):03d}",
+                        start_year=first,
+                        end_year=last,
+                        donors=donors[i : i + donors_per_shard],
+                        currency=currency,
+                    )
+                )
+
+    return shards
+
+
+def save_plan(shards: list[Shard], params: dict, path: Path) -> None:
+    """Save a plan and the parameters shared by all its shards."""
+    plan = {"params": params, "shards": [asdict(s) for s in shards]}
+    Path(path).write_text(json.dumps(plan, indent=2))
+
+
+def load_plan(path: Path) -> tuple[list[Shard], dict]:
+    plan = json.loads(Path(path).read_text())
+    return [Shard(**s) for s in plan["shards"]], plan["params"]
+
+
+def run_shard(shard: Shard, params: dict, scratch: Path) -> Path:
+    """Compute the partial aggregate for one shard and write it with its manifest."""
+    scratch = Path(scratch)
+
+    data = total_bi_plus_multi_health_spending(
+        donors=shard.donors,
+        start_year=shard.start_year,
+        end_year=shard.end_year,
+        currency=shard.currency,
+        **params,
+    ).assign(currency=shard.currency)
+
+    path = scratch / f"{shard.shard_id}.parquet"
+    write_atomic(data, path, fmt="parquet")
+
+    manifest = {
+        "shard": asdict(shard),
+        "params": params,
+        "load_start_year": shard.load_start_year,
+        "rows": len(data),
+        "sha256": hashlib.sha256(path.read_bytes()).hexdigest(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    (scratch / f"{shard.shard_id}.json").write_text(json.dumps(manifest, indent=2))
+
+    return path
+
+
+def merge_shards(plan: Path, scratch_dirs: list[Path]) -> pd.DataFrame:
+    """Combine the partial aggregates of every shard in a plan.
+
+    Raises:
+        ValueError: if a shard is missing, was run with different parameters,
+            or its partial file does not match its manifest.
+    """
+    shards, params = load_plan(plan)
+
+    manifests = {}
+    for folder in map(Path, scratch_dirs):
+        for path in folder.glob("*.json"):
+            manifests[path.stem] = (folder, json.loads(path.read_text()))
+
+    missing = [s.shard_id for s in shards if s.shard_id not in manifests]
+    if missing:
+        raise ValueError(f"Missing shards: {missing}")
+
+    partials = []
+    for shard in shards:
+        folder, manifest = manifests[shard.shard_id]
+        path = folder / f"{shard.shard_id}.parquet"
+
+        if manifest["params"] != params or manifest["shard"] != asdict(shard):
+            raise ValueError(f"Shard {shard.shard_id} does not match the plan")
+
+        if hashlib.sha256(path.read_bytes()).hexdigest() != manifest["sha256"]:
+            raise ValueError(f"Shard {shard.shard_id} is corrupted")
+
+        partials.append(pd.read_parquet(path))
+
+    return groupby_sum(pd.concat(partials, ignore_index=True), GROUPER)
+
+
+def export_merged(
+    data: pd.DataFrame, params: dict, export_by_donor: bool = False, fmt: str = "csv"
+) -> None:
+    """Write merged data to the output folder, one set of files per currency."""
+    currencies = data.currency.unique()
+
+    for currency, group in data.groupby("currency"):
+        filename = "bi_plus_multi_health_spending_covid_non_covid"
+        if len(currencies) > 1:
+            filename += f"_{currency}"
+
+        write_export(
+            reshape_for_export(group.drop(columns="currency")),
+            prices=params["prices"],
+            currency=currency,
+            export_by_donor=export_by_donor,
+            fmt=fmt,
+            filename=filename,
+        )
+
+
+def run_local(plan: Path, scratch: Path, processes: Optional[int] = None) -> list[Path]:
+    """Simulate a multi-machine run: each shard in its own process and scratch folder."""
+    shards, params = load_plan(plan)
+    folders = [Path(scratch) / shard.shard_id for shard in shards]
+    for folder in folders:
+        folder.mkdir(parents=True, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as pool:
+        list(pool.map(run_shard, shards, [params] * len(shards), folders))
+
+    return folders
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--profile", action="store_true", help="write profiles to output/_profiles"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan = commands.add_parser("plan", help="split a run into shards")
+    plan.add_argument("--plan", type=Path, required=True)
+    plan.add_argument("--start-year", type=int, default=2012)
+    plan.add_argument("--end-year", type=int, default=2022)
+    plan.add_argument("--donors", type=lambda s: [int(d) for d in s.split(",")])
+    plan.add_argument("--currencies", type=lambda s: s.split(","), default=["USD"])
+    plan.add_argument("--years-per-shard", type=int, default=5)
+    plan.add_argument("--donors-per-shard", type=int)
+    plan.add_argument("--prices", default="constant")
+    plan.add_argument("--base-year", type=int, default=2022)
+    plan.add_argument("--by-recipient", action="store_true")
+
+    run = commands.add_parser("run", help="run a single shard")
+    run.add_argument("--plan", type=Path, required=True)
+    run.add_argument("--shard", required=True)
+    run.add_argument("--scratch", type=Path, required=True)
+
+    for name, description in {
+        "merge": "merge the shards of a plan",
+        "local": "run every shard locally, then merge them",
+    }.items():
+        command = commands.add_parser(name, help=description)
+        command.add_argument("--plan", type=Path, required=True)
+        command.add_argument("--scratch", type=Path, nargs="+", required=True)
+        command.add_argument("--export-by-donor", action="store_true")
+        command.add_argument("--fmt", default="csv")
+    commands.choices["local"].add_argument("--processes", type=int)
+
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        # Also picked up by the shard processes started by `local`
+        os.environ["HEALTH_ODA_PROFILE"] = "1"
+
+    if args.command == "plan":
+        donors = args.donors or [d for codes, _ in DONORS for d in codes]
+        shards = plan_shards(
+            start_year=args.start_year,
+            end_year=args.end_year,
+            donors=donors,
+            currencies=args.currencies,
+            years_per_shard=args.years_per_shard,
+            donors_per_shard=args.donors_per_shard,
+        )
+        params = {
+            "prices": args.prices,
+            "base_year": args.base_year,
+            "by_recipient": args.by_recipient,
+        }
+        save_plan(shards, params, args.plan)
+
+    elif args.command == "run":
+        shards, params = load_plan(args.plan)
+        shard = next(s for s in shards if s.shard_id == args.shard)
+        args.scratch.mkdir(parents=True, exist_ok=True)
+        run_shard(shard, params, args.scratch)
+
+    else:
+        scratch_dirs = args.scratch
+        if args.command == "local":
+            scratch_dirs = run_local(args.plan, args.scratch[0], args.processes)
+
+        _, params = load_plan(args.plan)
+        export_merged(
+            merge_shards(args.plan, scratch_dirs),
+            params,
+            export_by_donor=args.export_by_donor,
+            fmt=args.fmt,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+from filelock import FileLock
+
+from scripts import config
+from scripts.cache import (
+    cache_key,
+    crs_version,
+    open_shared_table,
+    write_shared_table,
+)
+from scripts.common import (
+    flag_covid_keyword,
+    flag_covid_purpose,
+    flag_covid_trust_fund,
+    get_health_oda_indicator,
+)
+from scripts.logger import logger
+
+MANIFEST: str = "manifest.json"
+
+
+def _update_manifest(folder: Path, key: str, entry: dict) -> None:
+    """Add an entry to the manifest. Must be called while holding the lock."""
+    path = folder / MANIFEST
+    manifest = json.loads(path.read_text()) if path.exists() else {}
+    manifest[key] = entry
+
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, path)
+
+
+def get_shared_health_oda_indicator(
+    indicator: str | list[str],
+    start_year: int = 2000,
+    end_year: int = 2023,
+    prices: str = "current",
+    currency: str = "USD",
+    base_year: Optional[int] = None,
+    as_arrow: bool = False,
+) -> pd.DataFrame | pa.Table:
+    """Get the health data for an indicator, with COVID-19 flags, from a shared file.
+
+    The first process to ask for a given set of parameters builds the data and
+    writes it to `raw_data/shared` as an Arrow IPC file. Every other process
+    memory maps that file instead of reading the CRS again, so N workers share a
+    single physical copy of the data. The file is built again once the raw CRS
+    file changes.
+
+    The dataframe returned is backed by Arrow (pd.ArrowDtype columns) to avoid copying.
+    """
+    params = {
+        "indicator": indicator,
+        "start_year": start_year,
+        "end_year": end_year,
+        "prices": prices,
+        "currency": currency,
+        "base_year": base_year,
+    }
+    folder = config.Paths.shared
+    source = {"crs_version": crs_version()}
+    key = cache_key(params | source)
+    path = folder / f"{key}.arrow"
+
+    if not path.exists():
+        folder.mkdir(parents=True, exist_ok=True)
+
+        with FileLock(str(folder / ".shared.lock")):
+            # Another process may have written the file while we waited
+            if not path.exists():
+                logger.info(f"Building shared data for {indicator}")
+                df = (
+                    get_health_oda_indicator(**params)
+                    .pipe(flag_covid_keyword)
+                    .pipe(flag_covid_purpose)
+                    .pipe(flag_covid_trust_fund)
+                )
+                write_shared_table(df, path)
+                _update_manifest(
+                    folder,
+                    key,
+                    {
+                        "filename": path.name,
+                        "created_at": datetime.now(timezone.utc).isoformat(),
+                        "rows": len(df),
+                        "params": params,
+                        **source,
+                    },
+                )
+
+    table = open_shared_table(path)
+
+    if as_arrow:
+        return table
+
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
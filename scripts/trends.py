@@ -0,0 +1,268 @@
+import importlib
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from scripts import config
+from scripts.export import write_atomic
+from scripts.logger import logger
+
+# Bump when the layout of the stored state changes
+STATE_VERSION: int = 1
+
+# The `health_with_and_without_covid` outputs, and the column identifying a series
+SOURCES: dict = {
+    "donor": ("scripts.all_donors_all_recipients", "donor_code"),
+    "recipient_group": ("scripts.all_donors_recipient_groupings", "recipient"),
+}
+
+METRICS: list = [
+    "yoy_change",
+    "yoy_pct",
+    "rolling_mean",
+    "cagr",
+    "lowest_since",
+]
+
+
+@dataclass
+class TrendState:
+    """The running state needed to extend the trends by one year.
+
+    For each (key, indicator) series it keeps the values of the last `window`
+    years and a stack of (year, value) pairs with strictly increasing values,
+    used to find the last year with a value at or below the current one.
+    """
+
+    key: str
+    window: int
+    params: dict
+    last_year: Optional[int] = None
+    series: dict = field(default_factory=dict)
+    version: int = STATE_VERSION
+
+
+def _series_id(key, indicator: str) -> str:
+    return json.dumps([key, indicator])
+
+
+def _step(series: dict, year: int, value: float, window: int) -> dict:
+    """Add one year to a series, returning the metrics for that year."""
+    trailing = {int(y): v for y, v in series.get("trailing", {}).items()}
+    stack = series.get("stack", [])
+
+    previous = trailing.get(year - 1)
+    start = trailing.get(year - window)
+    in_window = [trailing.get(y) for y in range(year - window + 1, year)]
+
+    metrics = {
+        "yoy_change": np.nan,
+        "yoy_pct": np.nan,
+        "rolling_mean": np.nan,
+        "cagr": np.nan,
+        "lowest_since": np.nan,
+    }
+
+    if previous is not None:
+        metrics["yoy_change"] = value - previous
+        if previous != 0:
+            metrics["yoy_pct"] = value / previous - 1
+
+    if all(v is not None for v in in_window):
+        metrics["rolling_mean"] = (sum(in_window) + value) / window
+
+    if start is not None and start > 0 and value > 0:
+        metrics["cagr"] = (value / start) ** (1 / window) - 1
+
+    # Years with a higher value can never again be the answer for a later year
+    while stack and stack[-1][1] > value:
+        stack.pop()
+    if stack:
+        metrics["lowest_since"] = stack[-1][0]
+    stack.append([year, value])
+
+    trailing[year] = value
+    series["trailing"] = {y: v for y, v in trailing.items() if y > year - window}
+    series["stack"] = stack
+
+    return metrics
+
+
+def _to_long(data: pd.DataFrame, key: str) -> pd.DataFrame:
+    """Reshape a wide `health_with_and_without_covid` output to one row per value.
+
+    Rows without a key (e.g. flows with no donor code) are not a series, and are
+    dropped.
+    """
+    return (
+        data.melt(id_vars=["year", key], var_name="indicator", value_name="value")
+        .dropna(subset=["value", key])
+        .sort_values(["year", key, "indicator"])
+    )
+
+
+def update_trends(
+    state: TrendState, data: pd.DataFrame
+) -> tuple[pd.DataFrame, TrendState]:
+    """Extend the trends with the years in `data`, using only the stored state.
+
+    Args:
+        state: the state returned by a previous call, or an empty TrendState.
+        data: a wide `health_with_and_without_covid` output. Its years must all
+            come after the last year in the state, without gaps.
+
+    Returns:
+        The trend metrics for the new years, and the updated state.
+
+    Raises:
+        ValueError: If `data` has no values, or its years do not extend the state.
+    """
+    data = _to_long(data, state.key)
+    if data.empty:
+        raise ValueError(
+            "There is no data to add to the trends. "
+            "Check that the years requested have been published."
+        )
+
+    years = sorted(int(y) for y in data.year.unique())
+    expected = range(years[0], years[0] + len(years))
+    if state.last_year is not None:
+        expected = range(state.last_year + 1, state.last_year + 1 + len(years))
+
+    if list(expected) != years:
+        raise ValueError(
+            f"Years {years} do not extend the trends ending in {state.last_year}. "
+            "Rebuild the trends if earlier years have been revised."
+        )
+
+    rows = []
+    for row in data.itertuples(index=False):
+        key, indicator = getattr(row, state.key), row.indicator
+        key = key.item() if hasattr(key, "item") else key
+        series = state.series.setdefault(_series_id(key, indicator), {})
+        metrics = _step(series, int(row.year), float(row.value), state.window)
+        rows.append(
+            {
+                state.key: key,
+                "indicator": indicator,
+                "year": int(row.year),
+                "value": row.value,
+                **metrics,
+            }
+        )
+
+    state.last_year = int(years[-1])
+
+    trends = pd.DataFrame(
+        rows, columns=[state.key, "indicator", "year", "value"] + METRICS
+    )
+
+    return trends.astype({"lowest_since": "Int64"}), state
+
+
+def compute_trends(
+    data: pd.DataFrame, key: str, window: int = 3, params: Optional[dict] = None
+) -> tuple[pd.DataFrame, TrendState]:
+    """Compute the trend metrics for a full history.
+
+    Args:
+        data: a wide `health_with_and_without_covid` output.
+        key: the column identifying a series, e.g. "donor_code" or "recipient".
+        window: the number of years for rolling averages and CAGR.
+        params: the parameters used to produce `data`, kept in the state.
+
+    Returns:
+        One row per key, indicator and year with:
+            yoy_change / yoy_pct: the change on the previous year.
+            rolling_mean: the average of the last `window` years.
+            cagr: the compound annual growth rate over the last `window` years.
+            lowest_since: the last earlier year with a value at or below this
+                one. Empty when the value is the lowest on record.
+        And the state needed to append later years.
+    """
+    state = TrendState(key=key, window=window, params=params or {})
+    return update_trends(state, data)
+
+
+def save_state(state: TrendState, name: str) -> None:
+    folder = config.Paths.trends
+    folder.mkdir(parents=True, exist_ok=True)
+    (folder / f"{name}.json").write_text(json.dumps(asdict(state)))
+
+
+def load_state(name: str) -> TrendState:
+    path = config.Paths.trends / f"{name}.json"
+    state = TrendState(**json.loads(path.read_text()))
+
+    if state.version != STATE_VERSION:
+        raise ValueError(f"Trend state '{name}' is outdated. Rebuild the trends.")
+
+    return state
+
+
+def _source_data(source: str, **params) -> pd.DataFrame:
+    module, _ = SOURCES[source]
+    return importlib.import_module(module).health_with_and_without_covid(**params)
+
+
+def _output_path(source: str, params: dict) -> Path:
+    return config.Paths.output / f"health_trends_{source}_{params['prices']}.csv"
+
+
+def build_trends(
+    source: str = "donor",
+    start_year: int = 2008,
+    end_year: int = 2023,
+    prices: str = "constant",
+    base_year: int = 2023,
+    window: int = 3,
+    engine: str = "pandas",
+) -> pd.DataFrame:
+    """Compute the trends for a full history, saving them and their state.
+
+    Args:
+        source: "donor" for trends by donor, or "recipient_group" for trends by
+            region and income group.
+    """
+    params = {"prices": prices, "base_year": base_year, "engine": engine}
+
+    data = _source_data(source, start_year=start_year, end_year=end_year, **params)
+    trends, state = compute_trends(data, SOURCES[source][1], window, params)
+
+    save_state(state, source)
+    write_atomic(trends, _output_path(source, params), fmt="csv")
+
+    return trends
+
+
+def append_year(source: str = "donor", year: Optional[int] = None) -> pd.DataFrame:
+    """Extend saved trends by one year, only loading the data for that year.
+
+    Uses the same prices, base year and window as the saved trends. If earlier
+    years have been revised, run `build_trends` instead.
+    """
+    state = load_state(source)
+    year = year or state.last_year + 1
+    path = _output_path(source, state.params)
+
+    data = _source_data(source, start_year=year, end_year=year, **state.params)
+    new, state = update_trends(state, data)
+
+    trends = pd.concat([pd.read_csv(path), new], ignore_index=True)
+    trends = trends.astype({"lowest_since": "Int64"})
+
+    write_atomic(trends, path, fmt="csv")
+    save_state(state, source)
+
+    logger.info(f"Appended {year} to the {source} trends")
+
+    return trends
+
+
+if __name__ == "__main__":
+    build_trends("donor")
+    build_trends("recipient_group")
@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+from oda_data.classes.oda_data import READERS
+
+import scripts.session
+from scripts import config
+from tests.synthetic import FakeODAData, fake_convert_id, make_crs, make_session
+
+
+@pytest.fixture(autouse=True)
+def session(monkeypatch, tmp_path) -> scripts.session.HealthOdaSession:
+    """Serve the groupings and income levels from a synthetic session."""
+    session = make_session()
+    monkeypatch.setattr(scripts.session, "_session", session)
+    monkeypatch.setattr(config.Paths, "session", tmp_path / "session")
+    return session
+
+
+@pytest.fixture
+def crs() -> pd.DataFrame:
+    return make_crs()
+
+
+@pytest.fixture
+def pipeline(monkeypatch, tmp_path, crs) -> pd.DataFrame:
+    """Run the pipeline offline against the synthetic CRS."""
+    import scripts.all_donors_recipient_groupings as groupings
+    import scripts.common as common
+    import scripts.imputed_multilateral as imputed
+
+    monkeypatch.delenv("HEALTH_ODA_PROFILE", raising=False)
+    monkeypatch.setattr(FakeODAData, "crs", crs)
+    monkeypatch.setattr(common, "ODAData", FakeODAData)
+    monkeypatch.setattr(
+        imputed, "read_crs", lambda years: crs.loc[lambda d: d.year.isin(years)]
+    )
+    monkeypatch.setitem(READERS, "crs", imputed.read_crs)
+    monkeypatch.setattr(groupings, "convert_id", fake_convert_id)
+
+    return crs
@@ -0,0 +1,142 @@
+"""Synthetic CRS data and stand-ins for the oda_data and bblocks lookups."""
+
+import numpy as np
+import pandas as pd
+from oda_data.classes.oda_data import READERS
+
+from scripts.session import HealthOdaSession
+
+HEALTH_CODES: list = [12110, 12220, 12250, 12264, 12310, 13020, 13040]
+OTHER_CODES: list = [11110, 15110, 21010]
+DONORS: list = [1, 2, 3, 4, 5, 6, 7, 12, 301, 302, 918, 1047]
+RECIPIENTS: list = list(range(228, 288)) + [298, 610, 625, 665, 998]
+KEYWORDS: list = ["malaria", "vaccines", "COVID-19", "c19 response", ""]
+
+ID_COLUMNS: list = ["year", "donor_code", "recipient_code", "purpose_code"]
+
+
+def make_crs(
+    rows: int = 20_000,
+    years: range = range(2014, 2024),
+    seed: int = 0,
+    dtype_backend: str = "numpy_nullable",
+) -> pd.DataFrame:
+    """A synthetic CRS extract with the columns used by the pipeline.
+
+    About 1% of purpose codes, 2% of recipient codes and 0.5% of donor codes
+    are missing, as in the real data.
+    """
+    rng = np.random.default_rng(seed)
+
+    def with_missing(values, share):
+        values = values.astype(float)
+        values[rng.random(rows) < share] = np.nan
+        return values
+
+    keywords = rng.choice(KEYWORDS, rows).astype(object)
+    keywords[rng.random(rows) < 0.1] = None
+
+    data = pd.DataFrame(
+        {
+            "year": rng.choice(list(years), rows),
+            "donor_code": with_missing(rng.choice(DONORS, rows), 0.005),
+            "recipient_code": with_missing(rng.choice(RECIPIENTS, rows), 0.02),
+            "purpose_code": with_missing(
+                rng.choice(HEALTH_CODES + OTHER_CODES, rows), 0.01
+            ),
+            "project_title": [f"Project {i}" for i in rng.integers(0, 2_000, rows)],
+            "keywords": keywords,
+        }
+    )
+
+    data = data.astype({c: "Int64" for c in ID_COLUMNS}).astype(
+        {"project_title": "string", "keywords": "string"}
+    )
+    if dtype_backend == "pyarrow":
+        data = data.convert_dtypes(dtype_backend="pyarrow").astype(
+            {
+                "year": "int16[pyarrow]",
+                "donor_code": "int32[pyarrow]",
+                "recipient_code": "int32[pyarrow]",
+                "purpose_code": "int32[pyarrow]",
+            }
+        )
+
+    return data.assign(value=rng.lognormal(0, 2, rows))
+
+
+class FakeODAData:
+    """Stands in for `oda_data.ODAData`, serving indicators from a fixture frame.
+
+    Imputed indicators are read through `READERS["crs"]`, like the real class,
+    so that the COVID remapping of the imputed multilateral path is exercised.
+    """
+
+    crs: pd.DataFrame = None
+
+    def __init__(
+        self, years, donors=None, prices="current", base_year=None, currency="USD"
+    ):
+        self.years = list(years)
+        self.donors = donors
+        self.prices = prices
+        self.indicators = []
+
+    def load_indicator(self, indicator) -> None:
+        self.indicators = [indicator] if isinstance(indicator, str) else indicator
+
+    def get_data(self) -> pd.DataFrame:
+        frames = []
+        for indicator in self.indicators:
+            if indicator.startswith("imputed"):
+                data = READERS["crs"](self.years)
+                data = data.assign(value=data.value * 0.4)
+            else:
+                data = self.crs.loc[lambda d: d.year.isin(self.years)]
+            if self.donors is not None:
+                data = data.loc[lambda d: d.donor_code.isin(self.donors)]
+            frames.append(data.assign(indicator=indicator, prices=self.prices))
+
+        return pd.concat(frames, ignore_index=True)
+
+
+def fake_convert_id(series: pd.Series, to_type: str, **kwargs) -> pd.Series:
+    continent = series.map(
+        lambda c: "Africa" if c < 300 else "Asia", na_action="ignore"
+    )
+    return continent.astype(object).fillna("Other")
+
+
+def make_session() -> HealthOdaSession:
+    """A session with made-up groupings and income levels for the synthetic codes."""
+    levels = ["Low income", "Lower middle income", "Upper middle income"]
+    recipients = {
+        "all_recipients": RECIPIENTS,
+        "african_countries_regional": [r for r in RECIPIENTS if r < 300],
+        "sahel": RECIPIENTS[:5],
+        "ldc_countries": RECIPIENTS[::3],
+        "france_priority": RECIPIENTS[:10],
+    }
+    donors = {
+        "dac_members": DONORS,
+        "dac_countries": [d for d in DONORS if d not in (918, 1047)],
+        "g7": [4, 5, 12, 301, 302],
+        "eu27_countries": [4, 5, 6, 7],
+    }
+
+    def frame(groupings: dict) -> pd.DataFrame:
+        return pd.DataFrame(
+            [(g, c, f"Code {c}") for g, codes in groupings.items() for c in codes],
+            columns=["group", "code", "name"],
+        )
+
+    return HealthOdaSession(
+        recipient_groups=frame(recipients),
+        donor_groups=frame(donors),
+        income_levels=pd.DataFrame(
+            {
+                "recipient_code": RECIPIENTS,
+                "income_level": [levels[c % 3] for c in RECIPIENTS],
+            }
+        ),
+    )
@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+import scripts.common as common
+from scripts.aggregate import groupby_sum, spill_groupby_sum
+from scripts.bilateral import get_bilateral_health_oda
+
+BY: list = ["year", "donor_code", "recipient_code", "purpose_code"]
+
+
+def test_spill_matches_in_memory_groupby(crs):
+    chunks = (group for _, group in crs.groupby("year"))
+
+    # A budget this small forces every partition to be split again
+    result = spill_groupby_sum(chunks, BY, max_memory="1KB")
+
+    pd.testing.assert_frame_equal(
+        result, groupby_sum(crs, BY).sort_values(BY, ignore_index=True)
+    )
+
+
+@pytest.mark.parametrize("exclude_covid", [False, True])
+def test_bilateral_spills_only_the_final_aggregate(
+    pipeline, monkeypatch, exclude_covid
+):
+    spilled = []
+
+    def spy(chunks, by, max_memory):
+        spilled.append(by)
+        return spill_groupby_sum(chunks, by, max_memory)
+
+    monkeypatch.setattr(common, "spill_groupby_sum", spy)
+    kwargs = dict(
+        start_year=2016,
+        end_year=2023,
+        by_recipient=True,
+        exclude_covid=exclude_covid,
+    )
+
+    result = get_bilateral_health_oda(max_memory="1MB", **kwargs)
+    expected = get_bilateral_health_oda(**kwargs)
+
+    assert spilled == [["year", "indicator", "donor_code", "prices", "recipient_code"]]
+    pd.testing.assert_frame_equal(result, expected)
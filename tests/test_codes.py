@@ -0,0 +1,76 @@
+import json
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts import codes, config
+
+CODES: dict = {
+    "Sector": {
+        "12220": {"name": "Basic health care"},
+        "12264": {"name": "COVID-19 control"},
+    }
+}
+
+
+@pytest.fixture
+def code_lists(monkeypatch, tmp_path):
+    monkeypatch.setattr(config.Paths, "raw_data", tmp_path)
+    monkeypatch.setattr(config.Paths, "codes_index", tmp_path / "codes_index")
+    (tmp_path / "crs_codes.json").write_text(json.dumps(CODES))
+    codes._load_dimension.cache_clear()
+    yield
+    codes._load_dimension.cache_clear()
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        pd.Series([12264, None, 1], dtype="Int64"),
+        pd.Series([12264, None, 1], dtype="int16[pyarrow]"),
+        pd.Series([12264.0, np.nan, 1.0]),
+        np.array([12264.0, np.nan, 1.0]),
+        [12264, None, 1],
+    ],
+)
+def test_label_gives_missing_codes_no_name(code_lists, values):
+    names = codes.label(values, "purpose_code")
+
+    assert list(names) == ["COVID-19 control", None, None]
+    if isinstance(values, pd.Series):
+        assert names.index.equals(values.index)
+
+
+def test_label_reads_the_manifest_once(code_lists, monkeypatch):
+    codes.label([12220], "Sector")
+
+    reads = []
+    read_text = codes.Path.read_text
+    monkeypatch.setattr(
+        codes.Path, "read_text", lambda self: reads.append(self) or read_text(self)
+    )
+    for _ in range(3):
+        codes.label([12220], "Sector")
+
+    assert reads == []
+
+
+def test_building_the_index_does_not_import_the_pipeline(tmp_path):
+    (tmp_path / "crs_codes.json").write_text(json.dumps(CODES))
+    script = f"""
+import sys
+from pathlib import Path
+from scripts import codes, config
+config.Paths.raw_data = Path({str(tmp_path)!r})
+config.Paths.codes_index = config.Paths.raw_data / "codes_index"
+codes.label([12220], "Sector")
+print("oda_data" in sys.modules)
+"""
+    result = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    )
+
+    assert result.stdout.strip() == "False"
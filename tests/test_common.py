@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+from scripts.common import (
+    filter_covid_sectors,
+    remap_covid_keyword,
+    remap_covid_purpose,
+    remap_covid_trust_fund,
+    remove_covid,
+)
+from scripts.imputed_multilateral import read_crs_remap_covid
+from tests.synthetic import make_crs
+
+
+@pytest.mark.parametrize("dtype_backend", ["numpy_nullable", "pyarrow"])
+def test_remap_keeps_missing_codes(dtype_backend):
+    crs = make_crs(dtype_backend=dtype_backend)
+
+    purpose = remap_covid_purpose(crs).purpose_code
+    donor = remap_covid_trust_fund(crs).donor_code
+
+    assert purpose.isna().sum() == crs.purpose_code.isna().sum()
+    assert (purpose == 160).sum() == (crs.purpose_code == 12264).sum()
+    assert donor.isna().sum() == crs.donor_code.isna().sum()
+    assert (donor == 160).sum() == (crs.donor_code == 1047).sum()
+
+
+def test_read_crs_remap_covid_keeps_missing_codes(pipeline):
+    data = read_crs_remap_covid(range(2014, 2024))
+
+    # Rows with a COVID keyword are remapped whatever their purpose code
+    keyword = pipeline.keywords.str.contains("covid", case=False, na=False)
+    missing = pipeline.purpose_code.isna() & ~keyword
+
+    assert data.purpose_code.isna().sum() == missing.sum()
+    assert data.donor_code.isna().sum() == pipeline.donor_code.isna().sum()
+    assert not (data.purpose_code == 12264).any()
+
+
+@pytest.mark.parametrize(
+    "transform",
+    [
+        remap_covid_keyword,
+        remap_covid_purpose,
+        remap_covid_trust_fund,
+        filter_covid_sectors,
+        remove_covid,
+    ],
+)
+def test_transforms_do_not_modify_input(crs, transform):
+    before = crs.copy(deep=True)
+
+    result = transform(crs)
+    result.iloc[:, :] = result.iloc[::-1].to_numpy()
+
+    pd.testing.assert_frame_equal(crs, before)
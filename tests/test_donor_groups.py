@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+from scripts.donor_groups import EU_INSTITUTIONS, rollup_donor_groups
+
+DATA: pd.DataFrame = pd.DataFrame(
+    {"year": 2022, "donor_code": [4, 5, EU_INSTITUTIONS], "value": [1.0, 2.0, 4.0]}
+)
+
+GROUPS: dict = {"EU": [4, 5], "EU Institutions": [EU_INSTITUTIONS]}
+
+
+def _totals(groups: dict, **kwargs) -> dict:
+    data = rollup_donor_groups(DATA, groups, **kwargs)
+    return dict(zip(data.donor_group, data.value))
+
+
+def test_standalone_counts_eu_institutions_on_their_own():
+    assert _totals(GROUPS) == {"EU": 3.0, "EU Institutions": 4.0}
+
+
+def test_standalone_rejects_groups_sharing_eu_institutions():
+    groups = {**GROUPS, "Team Europe": [4, 5, EU_INSTITUTIONS]}
+
+    with pytest.raises(ValueError, match="Team Europe"):
+        rollup_donor_groups(DATA, groups)
+
+    assert _totals(groups, eu_institutions="include")["Team Europe"] == 7.0
+    assert _totals(groups, eu_institutions="exclude") == {"EU": 3.0, "Team Europe": 3.0}
+
+
+def test_net_subtracts_the_members_flows_through_eu_institutions():
+    groups = {**GROUPS, "Team Europe": [4, 5, EU_INSTITUTIONS]}
+    # Donor 4's imputed flows through 918, already part of 918's 4.0
+    via = pd.DataFrame({"year": 2022, "donor_code": [4], "value": [0.5]})
+
+    totals = _totals(groups, eu_institutions="net", via_eu_institutions=via)
+
+    assert totals == {"EU": 3.0, "EU Institutions": 4.0, "Team Europe": 6.5}
+    with pytest.raises(ValueError, match="via_eu_institutions"):
+        rollup_donor_groups(DATA, groups, eu_institutions="net")
@@ -0,0 +1,91 @@
+import pandas as pd
+import pytest
+
+import scripts.all_donors_all_recipients as all_recipients
+import scripts.all_donors_recipient_groupings as groupings
+from scripts.aggregate import groupby_sum
+from scripts.bilateral import get_bilateral_health_oda
+from scripts.common import filter_covid_sectors, get_health_oda_indicator, remove_covid
+from scripts.donors_all_recipients import total_bi_plus_multi_health_spending
+from scripts.imputed_multilateral import (
+    get_imputed_multilateral_health_oda,
+    imputed_health_with_and_without_covid,
+)
+from tests.synthetic import make_crs
+
+pytest.importorskip("duckdb")
+
+YEARS: dict = {"start_year": 2016, "end_year": 2023}
+
+# DuckDB sums in a different order, so totals can differ in the last bits
+RTOL: float = 1e-9
+
+# Public functions taking an `engine` argument
+FUNCTIONS: dict = {
+    "filter_covid_sectors": lambda crs, engine: filter_covid_sectors(
+        crs, engine=engine
+    ),
+    "remove_covid": lambda crs, engine: remove_covid(crs, engine=engine),
+    "groupby_sum": lambda crs, engine: groupby_sum(
+        crs, ["year", "donor_code", "recipient_code"], engine=engine
+    ),
+    "get_health_oda_indicator": lambda crs, engine: get_health_oda_indicator(
+        "crs_bilateral_flow_disbursement_gross", **YEARS, engine=engine
+    ),
+    "get_bilateral_health_oda": lambda crs, engine: get_bilateral_health_oda(
+        **YEARS, by_recipient=True, engine=engine
+    ),
+    "get_bilateral_health_oda_excluding_covid": lambda crs, engine: (
+        get_bilateral_health_oda(
+            **YEARS,
+            by_recipient=True,
+            exclude_covid=True,
+            additional_groupers=["purpose_code"],
+            engine=engine,
+        )
+    ),
+    "get_imputed_multilateral_health_oda": lambda crs, engine: (
+        get_imputed_multilateral_health_oda(
+            **YEARS, by_recipient=True, exclude_covid=True, engine=engine
+        )
+    ),
+    "imputed_health_with_and_without_covid": lambda crs, engine: (
+        imputed_health_with_and_without_covid(**YEARS, engine=engine)
+    ),
+    "all_recipients_health_with_and_without_covid": lambda crs, engine: (
+        all_recipients.health_with_and_without_covid(**YEARS, engine=engine)
+    ),
+    "recipient_groups_health_with_and_without_covid": lambda crs, engine: (
+        groupings.health_with_and_without_covid(**YEARS, engine=engine)
+    ),
+    "by_regions": lambda crs, engine: groupings.by_regions(
+        crs.drop(columns=["project_title", "keywords"]), engine=engine
+    ),
+    "by_income": lambda crs, engine: groupings.by_income(
+        crs.drop(columns=["project_title", "keywords"]), engine=engine
+    ),
+    "total_bi_plus_multi_health_spending": lambda crs, engine: (
+        total_bi_plus_multi_health_spending(**YEARS, engine=engine)
+    ),
+}
+
+
+@pytest.fixture(params=["numpy_nullable", "pyarrow"])
+def crs(request) -> pd.DataFrame:
+    return make_crs(dtype_backend=request.param)
+
+
+def _sorted(df: pd.DataFrame) -> pd.DataFrame:
+    keys = [c for c in df.columns if c != "value"]
+    return df.sort_values(keys, kind="stable").reset_index(drop=True)
+
+
+@pytest.mark.parametrize("name", FUNCTIONS)
+def test_engines_return_the_same_frames(name, pipeline):
+    func = FUNCTIONS[name]
+
+    expected = _sorted(func(pipeline, "pandas"))
+    result = _sorted(func(pipeline, "duckdb"))
+
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=RTOL)
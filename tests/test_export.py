@@ -0,0 +1,79 @@
+import os
+
+import pandas as pd
+import pytest
+
+import scripts.export as export
+from scripts.export import FORMATS, export_partitioned, write_atomic
+
+DATA: pd.DataFrame = pd.DataFrame(
+    {
+        "donor_name": ["France", "France", "Germany"],
+        "year": [2021, 2022, 2022],
+        "value": [1.5, 2.25, 4.0],
+    }
+)
+
+
+def test_write_atomic_replaces_the_file(tmp_path):
+    path = tmp_path / "data.csv"
+
+    assert write_atomic(DATA, path)
+    assert write_atomic(DATA.head(1), path)
+
+    pd.testing.assert_frame_equal(pd.read_csv(path), DATA.head(1))
+    assert os.listdir(tmp_path) == ["data.csv"]
+
+
+def test_failed_write_keeps_the_old_file(tmp_path, monkeypatch):
+    path = tmp_path / "data.csv"
+    write_atomic(DATA, path)
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(export.os, "replace", fail)
+    with pytest.raises(OSError):
+        write_atomic(DATA.head(1), path)
+
+    pd.testing.assert_frame_equal(pd.read_csv(path), DATA)
+    assert os.listdir(tmp_path) == ["data.csv"]
+
+
+@pytest.mark.parametrize("fmt", list(FORMATS))
+def test_unchanged_data_is_not_rewritten(tmp_path, fmt):
+    path = tmp_path / f"data{FORMATS[fmt]}"
+    write_atomic(DATA, path, fmt=fmt)
+    modified = path.stat().st_mtime_ns
+
+    # A copy serialises to the same bytes, so the file is left alone
+    assert not write_atomic(DATA.copy(), path, fmt=fmt)
+    assert path.stat().st_mtime_ns == modified
+
+
+def test_export_partitioned_writes_one_file_per_group(tmp_path):
+    written = export_partitioned(
+        DATA,
+        by="donor_name",
+        filename="{donor_name}_{prices}",
+        folder=tmp_path,
+        prices="current",
+    )
+
+    assert sorted(p.name for p in written) == [
+        "France_current.csv",
+        "Germany_current.csv",
+    ]
+    pd.testing.assert_frame_equal(
+        pd.read_csv(tmp_path / "France_current.csv"), DATA.head(2)
+    )
+    assert (
+        export_partitioned(
+            DATA,
+            by="donor_name",
+            filename="{donor_name}_{prices}",
+            folder=tmp_path,
+            prices="current",
+        )
+        == []
+    )
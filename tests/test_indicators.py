@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+import scripts.common as common
+from scripts.common import get_health_oda_indicator
+
+INDICATORS: list = [
+    "crs_bilateral_flow_disbursement_gross",
+    "crs_bilateral_all_flows_disbursement_gross",
+]
+
+YEARS: dict = {"start_year": 2016, "end_year": 2023}
+
+
+@pytest.fixture
+def loads(pipeline, monkeypatch) -> list:
+    """The indicators of each ODAData load."""
+    loads = []
+    get_data = common.ODAData.get_data
+
+    def spy(self):
+        loads.append(self.indicators)
+        return get_data(self)
+
+    monkeypatch.setattr(common.ODAData, "get_data", spy)
+    return loads
+
+
+def test_indicators_are_loaded_together(loads):
+    result = get_health_oda_indicator(INDICATORS, **YEARS)
+    assert loads == [INDICATORS]
+
+    singles = pd.concat(
+        [get_health_oda_indicator(i, **YEARS) for i in INDICATORS], ignore_index=True
+    )
+
+    pd.testing.assert_frame_equal(
+        result.astype({"indicator": str}).sort_values(
+            list(result.columns), ignore_index=True
+        ),
+        singles.astype({"indicator": str}).sort_values(
+            list(result.columns), ignore_index=True
+        ),
+    )
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{}, {"max_memory": "1MB"}, {"engine": "duckdb"}],
+    ids=["pandas", "max_memory", "duckdb"],
+)
+def test_indicator_stays_categorical(loads, kwargs):
+    if kwargs.get("engine") == "duckdb":
+        pytest.importorskip("duckdb")
+
+    result = get_health_oda_indicator(INDICATORS, **YEARS, **kwargs)
+
+    assert result.indicator.dtype == pd.CategoricalDtype(INDICATORS)
+    assert set(result.indicator) == set(INDICATORS)
@@ -0,0 +1,76 @@
+import tracemalloc
+
+import pytest
+
+import scripts.all_donors_all_recipients as all_recipients
+import scripts.all_donors_recipient_groupings as groupings
+from scripts.bilateral import get_bilateral_health_oda
+from scripts.common import get_health_oda_indicator
+from scripts.donors_all_recipients import total_bi_plus_multi_health_spending
+from scripts.imputed_multilateral import (
+    get_imputed_multilateral_health_oda,
+    imputed_health_with_and_without_covid,
+    read_crs_remap_covid,
+)
+
+YEARS: dict = {"start_year": 2016, "end_year": 2023}
+
+# Peak traced memory allowed for each entry point, as a multiple of the size of
+# the synthetic CRS fixture
+ENTRY_POINTS: dict = {
+    "get_health_oda_indicator": (
+        lambda: get_health_oda_indicator(
+            "crs_bilateral_flow_disbursement_gross", **YEARS
+        ),
+        1.5,
+    ),
+    "read_crs_remap_covid": (lambda: read_crs_remap_covid(range(2016, 2024)), 0.75),
+    "get_bilateral_health_oda": (
+        lambda: get_bilateral_health_oda(**YEARS, by_recipient=True),
+        1.5,
+    ),
+    "get_bilateral_health_oda_excluding_covid": (
+        lambda: get_bilateral_health_oda(**YEARS, exclude_covid=True),
+        1.5,
+    ),
+    "get_imputed_multilateral_health_oda": (
+        lambda: get_imputed_multilateral_health_oda(**YEARS, exclude_covid=True),
+        1.25,
+    ),
+    "imputed_health_with_and_without_covid": (
+        lambda: imputed_health_with_and_without_covid(**YEARS),
+        1.75,
+    ),
+    "all_recipients_health_with_and_without_covid": (
+        lambda: all_recipients.health_with_and_without_covid(**YEARS),
+        1.5,
+    ),
+    "recipient_groups_health_with_and_without_covid": (
+        lambda: groupings.health_with_and_without_covid(**YEARS),
+        1.5,
+    ),
+    "total_bi_plus_multi_health_spending": (
+        lambda: total_bi_plus_multi_health_spending(**YEARS),
+        2.5,
+    ),
+}
+
+
+def peak_memory(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize("name", ENTRY_POINTS)
+def test_peak_memory(name, pipeline):
+    func, ceiling = ENTRY_POINTS[name]
+    size = pipeline.memory_usage(deep=True).sum()
+
+    # The first call warms up imports and caches
+    func()
+
+    assert peak_memory(func) <= ceiling * size
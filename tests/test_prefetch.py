@@ -0,0 +1,147 @@
+import json
+import threading
+from collections import Counter
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from scripts import config
+from scripts.prefetch import prefetch, url_task
+
+FILES: dict = {"a.csv": b"x" * 10_000, "b.csv": b"y" * 20_000}
+
+# Served in two parts: the first response is cut off halfway
+CUT: bytes = bytes(range(256)) * 100
+
+
+@pytest.fixture
+def server(tmp_path):
+    """A local stand-in for the data sources, counting the requests per file."""
+    root = tmp_path / "remote"
+    root.mkdir()
+    for name, content in FILES.items():
+        (root / name).write_bytes(content)
+
+    requests = Counter()
+    ranges = []
+
+    class Handler(SimpleHTTPRequestHandler):
+        def do_GET(self):
+            name = self.path.lstrip("/")
+            requests[name] += 1
+
+            if name == "unavailable.csv":
+                self.send_error(503)
+            elif name == "cut.csv":
+                self._send_cut(requests[name])
+            else:
+                super().do_GET()
+
+        def _send_cut(self, attempt):
+            requested = self.headers.get("Range")
+            ranges.append(requested)
+            start = int(requested[6:-1]) if requested else 0
+
+            self.send_response(206 if start else 200)
+            self.send_header("Content-Length", str(len(CUT) - start))
+            self.end_headers()
+            if attempt == 1:
+                self.wfile.write(CUT[: len(CUT) // 2])
+                self.close_connection = True
+            else:
+                self.wfile.write(CUT[start:])
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), partial(Handler, directory=root))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    requests.ranges = ranges
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", requests
+
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def raw_data(monkeypatch, tmp_path):
+    folder = tmp_path / "raw_data"
+    folder.mkdir()
+    monkeypatch.setattr(config.Paths, "raw_data", folder)
+    monkeypatch.setattr(config.Paths, "prefetch", folder / "prefetch")
+    return folder
+
+
+def _tasks(url: str, names=FILES) -> list:
+    return [url_task(name, f"{url}/{name}", name) for name in names]
+
+
+def test_prefetch_downloads_and_skips_fresh_files(server, raw_data):
+    url, requests = server
+
+    assert set(prefetch(_tasks(url))) == set(FILES)
+    assert prefetch(_tasks(url)) == {}
+    assert requests == Counter({name: 1 for name in FILES})
+
+    for name, content in FILES.items():
+        assert (raw_data / name).read_bytes() == content
+
+    # The oda_reader cache manifest is left alone
+    assert not (raw_data / "manifest.json").exists()
+    manifest = json.loads((raw_data / "prefetch" / "manifest.json").read_text())
+    assert {name: record["filename"] for name, record in manifest.items()} == {
+        name: name for name in FILES
+    }
+
+
+def test_failed_task_keeps_the_successes(server, raw_data):
+    url, requests = server
+
+    with pytest.raises(RuntimeError, match="missing.csv"):
+        prefetch(_tasks(url, [*FILES, "missing.csv"]), retries=1)
+
+    manifest = json.loads((raw_data / "prefetch" / "manifest.json").read_text())
+    assert set(manifest) == set(FILES)
+
+    # Only the failed task is tried again
+    with pytest.raises(RuntimeError):
+        prefetch(_tasks(url, [*FILES, "missing.csv"]), retries=1)
+    assert requests == Counter({"a.csv": 1, "b.csv": 1, "missing.csv": 2})
+
+
+def test_concurrent_prefetches_download_each_file_once(server, raw_data):
+    url, requests = server
+    barrier = threading.Barrier(4)
+
+    def run():
+        barrier.wait()
+        prefetch(_tasks(url))
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert requests == Counter({name: 1 for name in FILES})
+
+
+def test_retried_download_resumes_from_the_partial_file(server, raw_data):
+    url, requests = server
+
+    prefetch([url_task("cut", f"{url}/cut.csv", "cut.csv")])
+
+    assert (raw_data / "cut.csv").read_bytes() == CUT
+    assert requests.ranges == [None, f"bytes={len(CUT) // 2}-"]
+
+
+def test_server_errors_are_retried_once_per_attempt(server, raw_data):
+    url, requests = server
+
+    with pytest.raises(RuntimeError, match="unavailable"):
+        prefetch(_tasks(url, ["unavailable.csv"]), retries=3)
+
+    assert requests["unavailable.csv"] == 3
@@ -0,0 +1,23 @@
+import os
+import sys
+
+from scripts.profiling import is_enabled, parse_profile_flag
+
+
+def test_host_command_line_does_not_enable_profiling(monkeypatch):
+    monkeypatch.delenv("HEALTH_ODA_PROFILE", raising=False)
+    monkeypatch.setattr(sys, "argv", ["host", "--profile"])
+
+    assert not is_enabled()
+
+
+def test_profile_flag_enables_profiling(monkeypatch):
+    # Set first so that monkeypatch restores the variable after the flag sets it
+    monkeypatch.setenv("HEALTH_ODA_PROFILE", "0")
+
+    parse_profile_flag([])
+    assert not is_enabled()
+
+    parse_profile_flag(["--profile"])
+    assert is_enabled()
+    assert os.environ["HEALTH_ODA_PROFILE"] == "1"
@@ -0,0 +1,91 @@
+import os
+
+import pandas as pd
+import pytest
+
+import scripts.search as search
+from scripts import config
+from scripts.common import get_health_oda_indicator
+from scripts.search import build_project_index, search_health_projects, tokenize
+
+YEARS: dict = {"start_year": 2016, "end_year": 2023}
+BY: list = ["year", "donor_code"]
+
+
+@pytest.fixture
+def index(pipeline, monkeypatch, tmp_path):
+    monkeypatch.setattr(config.Paths, "raw_data", tmp_path)
+    monkeypatch.setattr(config.Paths, "search_index", tmp_path / "search_index")
+    (tmp_path / "fullCRS.parquet").write_bytes(b"v1")
+    build_project_index(**YEARS)
+
+
+def brute_force(terms: list, years=None, donors=None) -> pd.DataFrame:
+    """Scan every row for the terms, without the index."""
+    data = get_health_oda_indicator("crs_bilateral_flow_disbursement_gross", **YEARS)
+    tokens = tokenize(data.project_title.fillna("") + " " + data.keywords.fillna(""))
+
+    def matches(row_tokens: list, term: str) -> bool:
+        return all(
+            any(t.startswith(w[:-1]) if w.endswith("*") else t == w for t in row_tokens)
+            for w in term.lower().split()
+        )
+
+    keep = tokens.map(lambda row: any(matches(row, term) for term in terms))
+    if years is not None:
+        keep &= data.year.isin(years)
+    if donors is not None:
+        keep &= data.donor_code.isin(donors)
+
+    return (
+        data.loc[keep]
+        .groupby(BY, dropna=False, observed=True, as_index=False)["value"]
+        .sum()
+    )
+
+
+@pytest.mark.parametrize(
+    "terms, filters",
+    [
+        (["malaria"], {}),
+        (["vacc*"], {}),
+        (["c19 response"], {}),
+        (["covid 19", "malaria"], {}),
+        (["c*"], {"years": [2018, 2020], "donors": [4, 5, 918]}),
+        (["gavi"], {}),
+    ],
+    ids=["exact", "prefix", "multi-word", "any-term", "filters", "empty"],
+)
+def test_search_matches_a_token_scan(index, terms, filters):
+    result = search_health_projects(terms, **filters)
+    expected = brute_force(terms, **filters)
+
+    pd.testing.assert_frame_equal(
+        result.sort_values(BY, ignore_index=True).astype({"value": float}),
+        expected.sort_values(BY, ignore_index=True),
+        check_dtype=False,
+    )
+    if terms == ["gavi"]:
+        assert result.empty
+
+
+def test_index_is_rebuilt_when_the_crs_changes(index, monkeypatch, tmp_path):
+    builds = []
+    build = search.build_project_index
+    monkeypatch.setattr(
+        search,
+        "build_project_index",
+        lambda **params: builds.append(params) or build(**params),
+    )
+
+    search_health_projects("malaria")
+    assert builds == []
+
+    source = tmp_path / "fullCRS.parquet"
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    search_health_projects("malaria")
+    search_health_projects("malaria")
+
+    assert len(builds) == 1
+    assert builds[0]["start_year"] == YEARS["start_year"]
@@ -0,0 +1,66 @@
+import threading
+from http.server import ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+from scripts import config
+from scripts.service import Dataset, QueryService, _handler, build_aggregates
+from scripts.service_load_test import run_load_test
+from tests.synthetic import make_crs
+
+
+@pytest.fixture(params=["numpy_nullable", "pyarrow"])
+def aggregate(request) -> pd.DataFrame:
+    crs = make_crs(rows=5_000, dtype_backend=request.param)
+    return (
+        crs.groupby(["year", "donor_code", "recipient_code"], dropna=False)["value"]
+        .sum()
+        .reset_index()
+        .assign(indicator="Health ODA")
+    )
+
+
+@pytest.mark.parametrize("by", [["recipient_code"], ["year", "donor_code"]])
+def test_select_groups_missing_keys_together(aggregate, by):
+    assert aggregate[by].isna().any().any()
+
+    expected = aggregate.groupby(by, dropna=False)["value"].sum().reset_index()
+    result = Dataset(aggregate).select({}, by)
+
+    pd.testing.assert_frame_equal(
+        result.astype({c: "float" for c in by}),
+        expected.astype({c: "float" for c in by}),
+        check_exact=False,
+    )
+
+
+def test_filters_never_match_missing_keys(aggregate):
+    dataset = Dataset(aggregate)
+    donors = aggregate.donor_code.dropna().unique()[:3].tolist()
+
+    rows = dataset.rows({"donor_code": donors})
+
+    assert set(dataset.index["donor_code"]) == set(aggregate.donor_code.dropna())
+    assert sorted(dataset.data.donor_code.take(rows).unique()) == sorted(donors)
+
+
+@pytest.mark.parametrize("prices, base_year", [("current", None), ("constant", 2022)])
+def test_load_test_queries_are_answered(
+    pipeline, monkeypatch, tmp_path, prices, base_year
+):
+    monkeypatch.setattr(config.Paths, "service", tmp_path / "service")
+    build_aggregates(start_year=2018, end_year=2023, prices=prices, base_year=base_year)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(QueryService()))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        results = run_load_test(url, duration=1, concurrency=2)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert results["requests"] > 0
+    assert results["errors"] == 0
@@ -0,0 +1,105 @@
+import json
+
+import pandas as pd
+import pytest
+
+from scripts.common import add_income_grouping, recipient_group
+from scripts.session import HealthOdaSession
+from tests.synthetic import make_session
+
+
+def test_lookups_come_from_the_session(session):
+    df = pd.DataFrame({"recipient_code": pd.array([228, 229, None], dtype="Int64")})
+
+    income = add_income_grouping(df).income_level
+
+    assert income.iloc[:2].tolist() == ["Low income", "Lower middle income"]
+    assert income.isna().iloc[2]
+    assert recipient_group("Africa") == session.recipient_group(
+        "african_countries_regional"
+    )
+    assert recipient_group("Developing Countries, Total") is None
+
+
+def test_snapshot_keeps_intermediates_until_their_version_changes(session, crs):
+    folder = session.save()
+    session.intermediate("crs", lambda: crs, version=1)
+
+    manifest = json.loads((folder / "manifest.json").read_text())
+    assert manifest["intermediates"] == {"crs": 1}
+
+    def fail():
+        raise AssertionError("The intermediate should come from the snapshot")
+
+    restored = HealthOdaSession.restore(folder)
+    assert restored.intermediates == {}
+    pd.testing.assert_frame_equal(restored.intermediate("crs", fail, version=1), crs)
+
+    updated = crs.head(10)
+    result = restored.intermediate("crs", lambda: updated, version=2)
+
+    assert result is updated
+    assert HealthOdaSession.restore(folder).versions == {"crs": 2}
+    with pytest.raises(AssertionError):
+        HealthOdaSession.restore(folder).intermediate("crs", fail, version=3)
+
+
+def test_imputed_flows_read_the_crs_once(pipeline, monkeypatch):
+    import scripts.imputed_multilateral as imputed
+
+    calls = []
+    read = imputed.read_crs
+    monkeypatch.setattr(
+        imputed, "read_crs", lambda years: calls.append(years) or read(years)
+    )
+
+    for exclude_covid in (False, True):
+        imputed.get_imputed_multilateral_health_oda(
+            start_year=2018, end_year=2023, exclude_covid=exclude_covid
+        )
+
+    assert calls == [[year] for year in range(2016, 2024)]
+
+
+def test_imputed_flows_leave_the_crs_reader_alone(pipeline, session):
+    from oda_data.classes.oda_data import READERS
+
+    import scripts.imputed_multilateral as imputed
+    from scripts.bilateral import get_bilateral_health_oda
+
+    reader = READERS["crs"]
+    for exclude_covid in (False, True):
+        imputed.get_imputed_multilateral_health_oda(
+            start_year=2018, end_year=2023, exclude_covid=exclude_covid
+        )
+        assert READERS["crs"] is reader
+
+    cached = set(session.intermediates)
+    get_bilateral_health_oda(2014, 2023, max_memory="1MB")
+
+    assert set(session.intermediates) == cached
+
+
+def test_least_recently_used_intermediates_are_dropped(crs):
+    years = {year: crs.loc[lambda d: d.year == year] for year in (2020, 2021, 2022)}
+    size = max(int(df.memory_usage(deep=True).sum()) for df in years.values())
+    session = make_session()
+    session.max_memory = 2 * size
+    session.save()
+
+    calls = []
+
+    def read(year):
+        calls.append(year)
+        return years[year]
+
+    for year in (2020, 2021, 2020, 2022):
+        session.intermediate(f"crs_{year}", read, year=year)
+
+    # 2021 was used least recently, and is read back from the snapshot
+    assert list(session.intermediates) == ["crs_2020", "crs_2022"]
+    assert calls == [2020, 2021, 2022]
+    pd.testing.assert_frame_equal(
+        session.intermediate("crs_2021", read, year=2021), years[2021]
+    )
+    assert calls == [2020, 2021, 2022]
@@ -0,0 +1,40 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import pandas as pd
+
+import scripts.sharding as sharding
+from scripts.donors_all_recipients import total_bi_plus_multi_health_spending
+from tests.synthetic import DONORS
+
+PARAMS: dict = {"prices": "current", "base_year": None, "by_recipient": True}
+
+
+def test_local_run_matches_the_unsharded_output(pipeline, monkeypatch, tmp_path):
+    # Forked shard processes keep the synthetic loader patched in
+    monkeypatch.setattr(
+        sharding,
+        "ProcessPoolExecutor",
+        partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context("fork")),
+    )
+    shards = sharding.plan_shards(
+        2016, 2023, DONORS, years_per_shard=3, donors_per_shard=4
+    )
+    plan = tmp_path / "plan.json"
+    sharding.save_plan(shards, PARAMS, plan)
+
+    folders = sharding.run_local(plan, tmp_path / "scratch", processes=2)
+    result = sharding.merge_shards(plan, folders)
+
+    expected = total_bi_plus_multi_health_spending(
+        donors=DONORS, start_year=2016, end_year=2023, **PARAMS
+    ).assign(currency="USD")
+
+    keys = ["year", "donor_code", "indicator"]
+    pd.testing.assert_frame_equal(
+        result[expected.columns].sort_values(keys, ignore_index=True),
+        expected.sort_values(keys, ignore_index=True),
+        check_exact=False,
+        check_dtype=False,
+    )
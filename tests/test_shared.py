@@ -0,0 +1,36 @@
+import os
+
+import scripts.shared as shared
+from scripts import config
+
+
+def test_shared_file_is_rebuilt_when_the_crs_changes(pipeline, monkeypatch, tmp_path):
+    monkeypatch.setattr(config.Paths, "raw_data", tmp_path)
+    monkeypatch.setattr(config.Paths, "shared", tmp_path / "shared")
+
+    builds = []
+    build = shared.get_health_oda_indicator
+    monkeypatch.setattr(
+        shared,
+        "get_health_oda_indicator",
+        lambda **params: builds.append(params) or build(**params),
+    )
+
+    def get():
+        return shared.get_shared_health_oda_indicator(
+            "crs_bilateral_flow_disbursement_gross", start_year=2016, end_year=2023
+        )
+
+    source = tmp_path / "fullCRS.parquet"
+    source.write_bytes(b"v1")
+    first = get()
+    get()
+    assert len(builds) == 1
+
+    # A refreshed CRS file has a new modification time
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    second = get()
+
+    assert len(builds) == 2
+    assert second.equals(first)
@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from scripts import config
+from scripts.trends import append_year, build_trends, compute_trends
+
+PARAMS: dict = {"prices": "current", "base_year": None}
+
+
+@pytest.fixture
+def folders(pipeline, monkeypatch, tmp_path):
+    monkeypatch.setattr(config.Paths, "output", tmp_path / "output")
+    monkeypatch.setattr(config.Paths, "trends", tmp_path / "trends")
+    (tmp_path / "output").mkdir()
+
+
+def test_append_year_matches_a_full_rebuild(folders):
+    build_trends("donor", start_year=2016, end_year=2022, **PARAMS)
+    appended = append_year("donor")
+
+    full = build_trends("donor", start_year=2016, end_year=2023, **PARAMS)
+
+    assert appended.donor_code.notna().all()
+    pd.testing.assert_frame_equal(
+        appended.sort_values(["donor_code", "indicator", "year"], ignore_index=True),
+        full.sort_values(["donor_code", "indicator", "year"], ignore_index=True),
+        check_dtype=False,
+    )
+
+
+def test_rows_without_a_key_are_not_a_series():
+    data = pd.DataFrame(
+        {
+            "year": [2020, 2020, 2021, 2021],
+            "donor_code": pd.array([4, None, 4, None], dtype="Int64"),
+            "Health ODA": [1.0, 5.0, 2.0, 6.0],
+        }
+    )
+
+    trends, state = compute_trends(data, "donor_code")
+
+    assert trends.donor_code.tolist() == [4, 4]
+    assert trends.yoy_change.tolist()[1] == 1.0
+    assert len(state.series) == 1
+
+
+def test_append_year_without_data_raises(folders):
+    build_trends("donor", start_year=2016, end_year=2023, **PARAMS)
+
+    with pytest.raises(ValueError, match="no data"):
+        append_year("donor", 2024)